@@ -0,0 +1,236 @@
+"""Benchmark de vazão do CartorioScraperOtimizado contra a réplica local do mapa ONR
+
+Exemplo:
+    python benchmark/benchmark.py --tamanhos 10 100 1000 --sessoes 2 --atraso-ms 800
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import oficial  # noqa: E402
+from servidor_onr_local import iniciar_servidor  # noqa: E402
+
+try:
+    import psutil
+except ImportError:  # sem psutil, o pico de RSS cobre só o processo Python
+    psutil = None
+
+
+class Medicoes:
+    """Tempos coletados durante uma execução, compartilhados entre as sessões"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.inicio_driver = []
+        self.carga_mapa = []
+        self.latencias = []
+
+    def registrar(self, lista, segundos):
+        with self.lock:
+            getattr(self, lista).append(segundos)
+
+
+class ScraperMedido(oficial.CartorioScraperOtimizado):
+    """Scraper que cronometra o início do driver, a carga do mapa e cada busca"""
+
+    medicoes = None
+
+    def setup_driver(self):
+        inicio = time.perf_counter()
+        super().setup_driver()
+        self.medicoes.registrar("inicio_driver", time.perf_counter() - inicio)
+
+    def aguardar_mapa_carregado(self, *args, **kwargs):
+        inicio = time.perf_counter()
+        pronto = super().aguardar_mapa_carregado(*args, **kwargs)
+        self.medicoes.registrar("carga_mapa", time.perf_counter() - inicio)
+        return pronto
+
+    def buscar_endereco(self, endereco):
+        inicio = time.perf_counter()
+        resultado = super().buscar_endereco(endereco)
+        self.medicoes.registrar("latencias", time.perf_counter() - inicio)
+        return resultado
+
+    def _nova_sessao(self, timeout_resultado=None):
+        if self.backend == "http":
+            return BackendHTTPMedido(self.url_api, timeout=timeout_resultado or self.timeout_resultado)
+        return super()._nova_sessao(timeout_resultado)
+
+
+class BackendHTTPMedido(oficial.BackendHTTP):
+    """Backend HTTP que cronometra cada busca"""
+
+    def buscar_endereco(self, endereco):
+        inicio = time.perf_counter()
+        resultado = super().buscar_endereco(endereco)
+        ScraperMedido.medicoes.registrar("latencias", time.perf_counter() - inicio)
+        return resultado
+
+
+class AmostradorRSS:
+    """Amostra em segundo plano o RSS do processo e dos filhos (chromedriver e Chrome)"""
+
+    def __init__(self, intervalo=0.2):
+        self.intervalo = intervalo
+        self.pico = 0
+        self.parar = threading.Event()
+        self.thread = threading.Thread(target=self._amostrar, daemon=True)
+
+    def _rss_atual(self):
+        processo = psutil.Process()
+        total = processo.memory_info().rss
+        for filho in processo.children(recursive=True):
+            try:
+                total += filho.memory_info().rss
+            except psutil.Error:
+                pass
+        return total
+
+    def _amostrar(self):
+        while not self.parar.wait(self.intervalo):
+            self.pico = max(self.pico, self._rss_atual())
+
+    def __enter__(self):
+        if psutil:
+            self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.parar.set()
+        if psutil:
+            self.thread.join()
+        else:
+            self.pico = self._pico_sem_psutil()
+
+    @staticmethod
+    def _pico_sem_psutil():
+        """Pico de RSS do processo Python pelo módulo resource (só POSIX); 0 quando indisponível"""
+        try:
+            import resource
+        except ImportError:  # Windows: sem psutil não há como medir
+            return 0
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss vem em KB no Linux e em bytes no macOS
+        return pico if sys.platform == "darwin" else pico * 1024
+
+
+def gerar_csv(caminho, quantidade):
+    """Gera um CSV de entrada com endereços sintéticos únicos"""
+    pd.DataFrame({
+        "rua": [f"Rua Benchmark {i}" for i in range(quantidade)],
+        "bairro": "Centro",
+        "cidade": "São Paulo",
+        "uf": "SP",
+        "cep": [f"{1000000 + i:08d}" for i in range(quantidade)],
+    }).to_csv(caminho, sep=";", index=False)
+
+
+def executar(quantidade, url_base, url_api, args):
+    """Roda o scraper sobre `quantidade` endereços e devolve as métricas da execução"""
+    medicoes = Medicoes()
+    ScraperMedido.medicoes = medicoes
+
+    with tempfile.TemporaryDirectory() as pasta:
+        arquivo_csv = os.path.join(pasta, f"bench_{quantidade}.csv")
+        gerar_csv(arquivo_csv, quantidade)
+
+        scraper = ScraperMedido(
+            arquivo_csv,
+            headless=True,
+            num_sessoes=args.sessoes,
+            num_abas=args.abas,
+            modo_espera=args.modo_espera,
+            perfil_enxuto=args.perfil_enxuto,
+            backend=args.backend,
+            url_api=url_api if args.backend == "http" else None,
+            url_base=url_base,
+            arquivo_cache=None,
+            # Sem --taxa-adaptativa, a pausa fixa (padrão 0) mede o scraper, não a subida do controlador
+            pausa_entre_buscas=None if args.taxa_adaptativa else args.pausa_fixa,
+            taxa_max=args.taxa_max
+        )
+
+        diretorio_original = os.getcwd()
+        os.chdir(pasta)
+        try:
+            with AmostradorRSS() as amostrador:
+                inicio = time.perf_counter()
+                df = scraper.processar_enderecos(confirmar=False)
+                duracao = time.perf_counter() - inicio
+        finally:
+            os.chdir(diretorio_original)
+
+    # Com várias abas a busca não passa por buscar_endereco: a latência vem das métricas do pool
+    latencias_ms = np.array(medicoes.latencias or oficial.METRICAS.duracoes.get("buscar_endereco", [])) * 1000
+    sucessos = 0 if df is None else int((~df["cartorio"].str.startswith("❌")).sum())
+    return {
+        "enderecos": quantidade,
+        "sucessos": sucessos,
+        "duracao_s": round(duracao, 2),
+        "enderecos_por_minuto": round(quantidade / duracao * 60, 1),
+        "latencia_p50_ms": round(float(np.percentile(latencias_ms, 50)), 1) if len(latencias_ms) else None,
+        "latencia_p95_ms": round(float(np.percentile(latencias_ms, 95)), 1) if len(latencias_ms) else None,
+        "inicio_driver_s": round(float(np.mean(medicoes.inicio_driver)), 2) if medicoes.inicio_driver else None,
+        "carga_mapa_s": round(float(np.mean(medicoes.carga_mapa)), 2) if medicoes.carga_mapa else None,
+        "pico_rss_mb": round(amostrador.pico / 2**20, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do scraper contra a réplica local do ONR")
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--sessoes", type=int, default=1)
+    parser.add_argument("--abas", type=int, default=1, help="abas por navegador com buscas simultâneas")
+    parser.add_argument("--atraso-ms", type=int, default=800, help="tempo de resposta simulado do ONR")
+    parser.add_argument("--backend", choices=["selenium", "http"], default="selenium")
+    parser.add_argument("--modo-espera", choices=["evento", "fixo"], default="evento")
+    parser.add_argument("--perfil-enxuto", action="store_true")
+    parser.add_argument("--pausa-fixa", type=float, default=0.0, metavar="SEGUNDOS",
+                        help="pausa entre buscas de cada sessão (padrão 0, sem controlador de taxa)")
+    parser.add_argument("--taxa-adaptativa", action="store_true",
+                        help="usa o controlador de taxa adaptativo no lugar da pausa fixa")
+    parser.add_argument("--taxa-max", type=float, default=10.0, help="teto do controlador em consultas/s")
+    parser.add_argument("--saida", help="grava os resultados em JSON neste arquivo")
+    args = parser.parse_args()
+
+    # O benchmark mede o scraper, não o console
+    logging.getLogger(oficial.__name__).setLevel(logging.WARNING)
+
+    servidor, url_base, url_api = iniciar_servidor(atraso_ms=args.atraso_ms)
+    print(f"🌐 Réplica local em {url_base} (atraso {args.atraso_ms} ms)")
+    if not psutil:
+        print("⚠️  psutil não instalado: o pico de RSS não inclui o Chrome (e fica zerado no Windows)")
+
+    resultados = []
+    try:
+        for quantidade in args.tamanhos:
+            print(f"\n⏱️  Executando com {quantidade} endereços...")
+            resultados.append(executar(quantidade, url_base, url_api, args))
+    finally:
+        servidor.shutdown()
+
+    print("\n" + "=" * 60)
+    print("📊 RESULTADOS")
+    print("=" * 60)
+    print(pd.DataFrame(resultados).to_string(index=False))
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump({"parametros": vars(args), "resultados": resultados}, f, indent=2, ensure_ascii=False)
+        print(f"\n📄 Resultados gravados em {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Servidor local que imita o mapa.onr.org.br para medir o scraper sem depender do site real"""
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+PAGINA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "onr_local.html")
+
+
+def resposta_cartorio(endereco):
+    """Resposta determinística no formato do ONR: o mesmo endereço sempre cai no mesmo cartório"""
+    partes = [p.strip() for p in endereco.split(",")]
+    cidade = partes[2] if len(partes) > 2 and partes[2] else "Cidade Local"
+    ordinal = int(hashlib.md5(endereco.encode("utf-8")).hexdigest(), 16) % 3 + 1
+    return f"O endereço digitado pertence ao {ordinal}º Registro de Imóveis de {cidade} - {cidade} - SP."
+
+
+class ManipuladorONRLocal(BaseHTTPRequestHandler):
+    """Serve a página do mapa em / e a consulta em /api/consulta?endereco=..."""
+
+    protocol_version = "HTTP/1.1"
+    atraso_ms = 800
+
+    def _responder(self, status, corpo, tipo):
+        self.send_response(status)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path in ("/", "/index.html"):
+            with open(PAGINA, "rb") as f:
+                self._responder(200, f.read(), "text/html; charset=utf-8")
+        elif url.path == "/api/consulta":
+            endereco = parse_qs(url.query).get("endereco", [""])[0]
+            # Atraso configurável, simulando o tempo de resposta do ONR
+            time.sleep(self.atraso_ms / 1000)
+            corpo = json.dumps({"endereco": endereco, "mensagem": resposta_cartorio(endereco)}, ensure_ascii=False)
+            self._responder(200, corpo.encode("utf-8"), "application/json; charset=utf-8")
+        else:
+            self._responder(404, b"{}", "application/json")
+
+    def log_message(self, formato, *args):
+        pass
+
+
+def iniciar_servidor(porta=0, atraso_ms=800, host="127.0.0.1"):
+    """Sobe o servidor em uma thread e retorna (servidor, url_base, url_api)"""
+    manipulador = type("ManipuladorConfigurado", (ManipuladorONRLocal,), {"atraso_ms": atraso_ms})
+    servidor = ThreadingHTTPServer((host, porta), manipulador)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, name="onr-local", daemon=True).start()
+
+    url_base = f"http://{host}:{servidor.server_port}/"
+    return servidor, url_base, url_base + "api/consulta"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Réplica local do mapa ONR para benchmark")
+    parser.add_argument("--porta", type=int, default=8088)
+    parser.add_argument("--atraso-ms", type=int, default=800, help="tempo de resposta da consulta (padrão 800)")
+    args = parser.parse_args()
+
+    servidor, url_base, url_api = iniciar_servidor(args.porta, args.atraso_ms)
+    print(f"🌐 Mapa local em {url_base} | API em {url_api} | atraso {args.atraso_ms} ms")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        servidor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
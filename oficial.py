@@ -1,5 +1,6 @@
 
 import time
+import numpy as np
 import pandas as pd
 from selenium import webdriver
 from selenium.webdriver.common.by import By
@@ -8,32 +9,1665 @@ from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.action_chains import ActionChains
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
+from selenium.common.exceptions import (
+    TimeoutException, NoSuchElementException, StaleElementReferenceException, WebDriverException
+)
+import abc
+import argparse
+import asyncio
+import atexit
+import contextlib
+import functools
+import hashlib
+import html
 import logging
+import logging.handlers
 import os
+import queue
+import re
+import sqlite3
+import threading
+import unicodedata
 from datetime import datetime
+from html.parser import HTMLParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
 import json
 
-# Configuração de logging
-logging.basicConfig(
-    level=logging.INFO, 
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('cartorio_scraper.log'),
-        logging.StreamHandler()
-    ]
-)
-logger = logging.getLogger(__name__)
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+except ImportError:  # requests só é necessário para o backend HTTP
+    requests = None
+
+try:
+    import aiohttp
+except ImportError:  # aiohttp só é necessário para o motor assíncrono
+    aiohttp = None
+
+try:
+    import psutil
+except ImportError:  # sem psutil, a reciclagem por memória fica desativada
+    psutil = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow só é necessário para a saída em Parquet
+    pa = pq = None
+
+# Configuração de logging: as threads só enfileiram os registros; a escrita em
+# arquivo e console fica com o QueueListener, fora do caminho das consultas
+_formato_log = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+_saidas_log = [logging.FileHandler('cartorio_scraper.log'), logging.StreamHandler()]
+for _saida in _saidas_log:
+    _saida.setFormatter(_formato_log)
+_fila_logs = queue.Queue(-1)
+_ouvinte_logs = logging.handlers.QueueListener(_fila_logs, *_saidas_log)
+_ouvinte_logs.start()
+atexit.register(_ouvinte_logs.stop)
+_entrada_log = logging.handlers.QueueHandler(_fila_logs)
+_entrada_log.setFormatter(logging.Formatter('%(message)s'))
+
+logging.basicConfig(
+    level=logging.INFO, 
+    handlers=[_entrada_log]
+)
+logger = logging.getLogger(__name__)
+
+# Onde o ONR exibe o resultado da consulta e o que identifica um texto de cartório
+SELETORES_RESULTADO = [
+    ".leaflet-popup-content",
+    ".popup-content",
+    "div[style*='background-color: yellow']",
+    ".alert-info",
+    ".notification"
+]
+PALAVRAS_CHAVE_CARTORIO = ['registro', 'cartório', 'cartorio', 'ri ', 'cnpj', 'imóveis']
+
+# Campos do JSON do endpoint que trazem o texto do popup, e a forma de um nome de cartório,
+# para não confundir com o endereço ecoado (ex.: "Rua Henri Dunant" contém 'ri ')
+CAMPOS_RESULTADO_ONR = ['mensagem', 'message', 'resultado', 'cartorio', 'cartório', 'texto', 'popup', 'html']
+REGEX_FORMA_CARTORIO = re.compile(
+    r'registro\s+(?:geral\s+)?de\s+im[óo]veis|cart[óo]rio|\b\d{1,3}\s*[ºª°o]\s*(?:ri|of[íi]cio)\b', re.IGNORECASE
+)
+
+# Primeiro texto visível de cartório, pela ordem dos seletores; usado tanto para o texto
+# de antes da busca quanto para a leitura do resultado, para que as duas sondas concordem
+_JS_TEXTO_CARTORIO = """
+function elementoCartorio(seletores, palavras) {
+    for (var i = 0; i < seletores.length; i++) {
+        var elementos = document.querySelectorAll(seletores[i]);
+        for (var j = 0; j < elementos.length; j++) {
+            var el = elementos[j];
+            if (!el.getClientRects().length) { continue; }
+            var texto = (el.innerText || '').trim();
+            var minusculo = texto.toLowerCase();
+            if (texto.length > 10 && palavras.some(function (p) { return minusculo.indexOf(p) !== -1; })) {
+                return el;
+            }
+        }
+    }
+    return null;
+}
+function textoCartorio(seletores, palavras) {
+    var el = elementoCartorio(seletores, palavras);
+    return el ? (el.innerText || '').trim() : null;
+}
+"""
+
+# Instala (uma vez por página) um MutationObserver que marca, com a geração da busca atual,
+# os elementos de resultado alterados; abre uma nova geração e devolve o texto exibido no momento
+JS_PREPARAR_ESPERA = _JS_TEXTO_CARTORIO + """
+var seletor = arguments[0].join(',');
+if (!window.__cartorioObservador) {
+    var marcar = function (el) {
+        for (var a = el && el.closest(seletor); a; a = a.parentElement && a.parentElement.closest(seletor)) {
+            a.__cartorioGeracao = window.__cartorioGeracao;
+        }
+    };
+    window.__cartorioObservador = new MutationObserver(function (registros) {
+        for (var i = 0; i < registros.length; i++) {
+            var alvo = registros[i].target;
+            marcar(alvo.nodeType === 1 ? alvo : alvo.parentElement);
+            var novos = registros[i].addedNodes;
+            for (var j = 0; j < novos.length; j++) {
+                var no = novos[j];
+                if (no.nodeType !== 1) { continue; }
+                marcar(no);
+                var internos = no.querySelectorAll(seletor);
+                for (var k = 0; k < internos.length; k++) { internos[k].__cartorioGeracao = window.__cartorioGeracao; }
+            }
+        }
+    });
+    window.__cartorioObservador.observe(document.body, {childList: true, subtree: true, characterData: true});
+}
+window.__cartorioGeracao = (window.__cartorioGeracao || 0) + 1;
+return textoCartorio(arguments[0], arguments[1]) || '';
+"""
+
+# Lê, em uma única chamada, o primeiro texto visível de cartório e se esse mesmo elemento
+# mudou desde o início da busca (mudanças em outros elementos de resultado não contam)
+JS_LER_RESULTADO = _JS_TEXTO_CARTORIO + """
+var el = elementoCartorio(arguments[0], arguments[1]);
+return {
+    texto: el ? (el.innerText || '').trim() : null,
+    mutacoes: el && el.__cartorioGeracao === window.__cartorioGeracao ? 1 : 0
+};
+"""
+
+# Recursos bloqueados no perfil enxuto: tiles do mapa, imagens, fontes e scripts de
+# terceiros; o geocodificador e o popup de resultado continuam liberados
+URLS_BLOQUEADAS_PERFIL_ENXUTO = [
+    "*tile.openstreetmap.org*", "*/tiles/*", "*basemaps.cartocdn.com*", "*arcgisonline.com*",
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.ico",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*fonts.googleapis.com*", "*fonts.gstatic.com*",
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+    "*facebook.net*", "*hotjar.com*", "*clarity.ms*"
+]
+
+# Seletores do campo de busca, em ordem de preferência
+SELETORES_CAMPO_BUSCA = [
+    "input[placeholder*='endereço']",
+    "input[placeholder*='Digite']",
+    "input[placeholder*='Buscar']",
+    "input[placeholder*='Search']",
+    ".leaflet-control-geocoder input",
+    "#geocoder input",
+    ".search-input",
+    ".address-input"
+]
+
+# Procura o campo de busca em uma única chamada: primeiro pelos seletores, depois
+# pelo primeiro input de texto visível e grande o suficiente
+JS_ENCONTRAR_CAMPO = """
+var seletores = arguments[0];
+function visivel(el) {
+    var estilo = window.getComputedStyle(el);
+    return el.getClientRects().length > 0 && estilo.visibility !== 'hidden' && estilo.display !== 'none';
+}
+for (var i = 0; i < seletores.length; i++) {
+    var elementos;
+    try { elementos = document.querySelectorAll(seletores[i]); } catch (e) { continue; }
+    for (var j = 0; j < elementos.length; j++) {
+        if (visivel(elementos[j]) && !elementos[j].disabled) {
+            return [elementos[j], 'seletor ' + (i + 1) + ': ' + seletores[i]];
+        }
+    }
+}
+var inputs = document.querySelectorAll("input[type='text']");
+for (var k = 0; k < inputs.length; k++) {
+    var r = inputs[k].getBoundingClientRect();
+    if (visivel(inputs[k]) && r.width > 100 && r.height > 20) {
+        return [inputs[k], 'fallback: width=' + Math.round(r.width) + ', height=' + Math.round(r.height)];
+    }
+}
+return null;
+"""
+
+# Extrai o texto do cartório em uma única chamada: seletores prioritários e, se nada
+# for encontrado, o elemento pai de qualquer texto com "Registro" ou "Cartório"
+JS_EXTRAIR_CARTORIO = _JS_TEXTO_CARTORIO + """
+var texto = textoCartorio(arguments[0], arguments[1]);
+if (texto) { return texto; }
+function visivel(el) { return el.getClientRects().length > 0; }
+var xpath = "//*[contains(text(), 'Registro') or contains(text(), 'Cartório')]";
+var achados = document.evaluate(xpath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+for (var k = 0; k < achados.snapshotLength; k++) {
+    var el = achados.snapshotItem(k);
+    if (visivel(el) && el.parentElement) {
+        var textoPai = (el.parentElement.innerText || '').trim();
+        if (textoPai.length > 10) { return textoPai; }
+    }
+}
+return null;
+"""
+
+# Mapeamento flexível de colunas
+COLUNAS_MAPEADAS = {
+    'rua': ['rua', 'logradouro', 'endereco', 'address'],
+    'bairro': ['bairro', 'distrito', 'neighborhood'],
+    'cidade': ['cidade', 'city', 'municipio'],
+    'uf': ['uf', 'estado', 'state'],
+    'cep': ['cep', 'postal_code', 'zip'],
+    'pais': ['pais', 'país', 'country']
+}
+VALORES_VAZIOS = ['nan', 'null', '']
+
+REGEX_CEP = re.compile(r'\b(\d{5})-?(\d{3})\b')
+
+# "... ao 2º Registro de Imóveis de Mogi das Cruzes - Mogi das Cruzes - SP."
+REGEX_CARTORIO = re.compile(
+    r'^(?:.*?\b(?P<cartorio_ordinal>\d{1,3})\s*[ºª°o]\s)?'
+    r'.*\s-\s(?P<cartorio_cidade>.+?)\s-\s(?P<cartorio_uf>[A-Z]{2})\.?\s*$'
+)
+COLUNAS_CARTORIO = list(REGEX_CARTORIO.groupindex)
+
+# Origem de cada resposta na coluna 'origem' da saída: consulta ao ONR, cache ou dedução pelo índice de CEP
+ORIGENS_INDICE = ["indice_cep", "indice_prefixo"]
+
+# Faixas de CEP (5 primeiros dígitos) de cada UF, segundo a tabela dos Correios
+FAIXAS_CEP_UF = [
+    (1000, 19999, 'SP'), (20000, 28999, 'RJ'), (29000, 29999, 'ES'), (30000, 39999, 'MG'),
+    (40000, 48999, 'BA'), (49000, 49999, 'SE'), (50000, 56999, 'PE'), (57000, 57999, 'AL'),
+    (58000, 58999, 'PB'), (59000, 59999, 'RN'), (60000, 63999, 'CE'), (64000, 64999, 'PI'),
+    (65000, 65999, 'MA'), (66000, 68899, 'PA'), (68900, 68999, 'AP'), (69000, 69299, 'AM'),
+    (69300, 69399, 'RR'), (69400, 69899, 'AM'), (69900, 69999, 'AC'), (70000, 72799, 'DF'),
+    (72800, 72999, 'GO'), (73000, 73699, 'DF'), (73700, 76799, 'GO'), (76800, 76999, 'RO'),
+    (77000, 77999, 'TO'), (78000, 78899, 'MT'), (79000, 79999, 'MS'), (80000, 87999, 'PR'),
+    (88000, 89999, 'SC'), (90000, 99999, 'RS'),
+]
+_INICIOS_CEP = np.array([inicio for inicio, _, _ in FAIXAS_CEP_UF])
+_FINS_CEP = np.array([fim for _, fim, _ in FAIXAS_CEP_UF])
+_UFS_CEP = np.array([uf for _, _, uf in FAIXAS_CEP_UF], dtype=object)
+
+UFS = {
+    'AC': 'Acre', 'AL': 'Alagoas', 'AP': 'Amapá', 'AM': 'Amazonas', 'BA': 'Bahia', 'CE': 'Ceará',
+    'DF': 'Distrito Federal', 'ES': 'Espírito Santo', 'GO': 'Goiás', 'MA': 'Maranhão',
+    'MT': 'Mato Grosso', 'MS': 'Mato Grosso do Sul', 'MG': 'Minas Gerais', 'PA': 'Pará',
+    'PB': 'Paraíba', 'PR': 'Paraná', 'PE': 'Pernambuco', 'PI': 'Piauí', 'RJ': 'Rio de Janeiro',
+    'RN': 'Rio Grande do Norte', 'RS': 'Rio Grande do Sul', 'RO': 'Rondônia', 'RR': 'Roraima',
+    'SC': 'Santa Catarina', 'SP': 'São Paulo', 'SE': 'Sergipe', 'TO': 'Tocantins'
+}
+PAISES = {'br', 'bra', 'brasil', 'brazil'}
+REGEX_CEP_CAMPO = r'\d{5}-?\d{3}'
+
+
+def normalizar_endereco(endereco):
+    """Normaliza o endereço para comparação: sem acentos, pontuação ou caixa"""
+    texto = unicodedata.normalize('NFKD', str(endereco))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    texto = re.sub(r'[^0-9a-z]+', ' ', texto.lower())
+    return ' '.join(texto.split())
+
+
+def extrair_cep(texto):
+    """Extrai o CEP (somente dígitos) de um texto, ou string vazia"""
+    encontrado = REGEX_CEP.search(str(texto))
+    return encontrado.group(1) + encontrado.group(2) if encontrado else ''
+
+
+def normalizar_cep(valores):
+    """Formata CEPs como 00000-000, tolerando pontos, espaços e o zero à esquerda perdido pelo Excel"""
+    digitos = valores.str.replace(r'[.\s-]', '', regex=True)
+    formatar = digitos.str.fullmatch(r'\d{7,8}')
+    digitos = digitos.str.zfill(8)
+    return valores.mask(formatar, digitos.str[:5] + '-' + digitos.str[5:])
+
+
+def uf_do_cep(ceps):
+    """UF de cada CEP pela tabela de faixas (NaN para CEP vazio, malformado ou fora das faixas)"""
+    prefixos = pd.to_numeric(ceps.str.replace('-', '', regex=False).str[:5], errors='coerce')
+    prefixos = prefixos.where(ceps.str.fullmatch(REGEX_CEP_CAMPO)).to_numpy(dtype=float, na_value=np.nan)
+    posicoes = np.clip(np.searchsorted(_INICIOS_CEP, prefixos, side='right') - 1, 0, None)
+    dentro = (prefixos >= _INICIOS_CEP[posicoes]) & (prefixos <= _FINS_CEP[posicoes])
+    return pd.Series(np.where(dentro, _UFS_CEP[posicoes], None), index=ceps.index)
+
+
+_SIGLAS_POR_NOME = {normalizar_endereco(nome): sigla for sigla, nome in UFS.items()}
+_SIGLAS_POR_NOME.update({sigla.lower(): sigla for sigla in UFS})
+
+
+def sigla_uf(valores):
+    """Sigla da UF a partir da sigla ou do nome do estado (NaN quando não reconhece)"""
+    # Poucos valores distintos por coluna: normaliza cada um uma única vez
+    mapa = {valor: _SIGLAS_POR_NOME.get(normalizar_endereco(valor)) for valor in pd.unique(valores)}
+    return valores.map(mapa)
+
+
+def chave_endereco(endereco):
+    """Chave de identificação do endereço: endereço normalizado + CEP"""
+    return f"{normalizar_endereco(endereco)}|{extrair_cep(endereco)}"
+
+
+def limpar_texto_cartorio(texto):
+    """Limpa e formata o texto do cartório"""
+    # Remove quebras de linha excessivas
+    texto = ' '.join(texto.split())
+    
+    # Limita o tamanho se muito longo
+    if len(texto) > 500:
+        texto = texto[:500] + "..."
+    
+    return texto
+
+
+def separar_cartorio(cartorios):
+    """Separa o texto do cartório em colunas tipadas: ordinal, cidade e UF (vazias quando não casam)"""
+    partes = cartorios.astype('string').str.extract(REGEX_CARTORIO)
+    partes['cartorio_ordinal'] = pd.to_numeric(partes['cartorio_ordinal']).astype('Int16')
+    return partes
+
+
+def texto_e_cartorio(texto):
+    """Indica se o texto parece uma resposta de cartório"""
+    return len(texto) > 10 and any(palavra in texto.lower() for palavra in PALAVRAS_CHAVE_CARTORIO)
+
+
+class _ArvoreHTML(HTMLParser):
+    """Árvore mínima de um trecho HTML: tag, atributos, texto próprio e texto completo de cada elemento"""
+    
+    VAZIOS = {"br", "hr", "img", "input", "meta", "link", "area", "base", "col", "source", "wbr"}
+    # Blocos quebram linha no innerText; elementos em linha não
+    BLOCOS = {"p", "div", "li", "ul", "ol", "td", "th", "tr", "table", "section", "article",
+              "header", "footer", "h1", "h2", "h3", "h4", "h5", "h6"}
+    
+    def __init__(self, conteudo):
+        super().__init__(convert_charrefs=True)
+        self.elementos = []
+        self.abertos = []
+        self.feed(conteudo)
+        self.close()
+    
+    def handle_starttag(self, tag, atributos):
+        if tag == "br" or tag in self.BLOCOS:
+            self.handle_data("\n")
+        if tag in self.VAZIOS:
+            return
+        elemento = {"tag": tag, "atributos": dict(atributos), "pai": self.abertos[-1] if self.abertos else None,
+                    "proprio": [], "texto": []}
+        self.elementos.append(elemento)
+        self.abertos.append(elemento)
+    
+    def handle_endtag(self, tag):
+        if tag in self.BLOCOS:
+            self.handle_data("\n")
+        # Fecha até a tag correspondente, tolerando tags sem fechamento
+        for indice in range(len(self.abertos) - 1, -1, -1):
+            if self.abertos[indice]["tag"] == tag:
+                del self.abertos[indice:]
+                return
+    
+    def handle_data(self, dados):
+        if self.abertos:
+            self.abertos[-1]["proprio"].append(dados)
+        for elemento in self.abertos:
+            elemento["texto"].append(dados)
+
+
+def _casa_seletor(elemento, seletor):
+    """Casa os seletores simples de SELETORES_RESULTADO (.classe e tag[atributo*='valor'])"""
+    if seletor.startswith("."):
+        return seletor[1:] in (elemento["atributos"].get("class") or "").split()
+    casamento = re.fullmatch(r"(\w+)\[(\w+)\*='([^']+)'\]", seletor)
+    return bool(casamento) and elemento["tag"] == casamento.group(1) \
+        and casamento.group(3) in (elemento["atributos"].get(casamento.group(2)) or "")
+
+
+def _cartorio_do_html(conteudo):
+    """Mesma busca do JS_EXTRAIR_CARTORIO sobre o HTML: bloco inteiro do resultado, senão o pai do trecho com 'Registro'"""
+    elementos = _ArvoreHTML(conteudo).elementos
+    for seletor in SELETORES_RESULTADO:
+        for elemento in elementos:
+            texto = ''.join(elemento["texto"]).strip()
+            if _casa_seletor(elemento, seletor) and texto_e_cartorio(texto):
+                return texto
+    for elemento in elementos:
+        proprio = ''.join(elemento["proprio"])
+        if elemento["pai"] and ('Registro' in proprio or 'Cartório' in proprio):
+            texto_pai = ''.join(elemento["pai"]["texto"]).strip()
+            if len(texto_pai) > 10:
+                return texto_pai
+    texto = html.unescape(re.sub(r'<[^>]+>', ' ', conteudo)).strip()
+    return texto if texto_e_cartorio(texto) else None
+
+
+def interpretar_resposta_onr(conteudo, consulta=None):
+    """Extrai da resposta do endpoint (JSON ou HTML) o mesmo texto que extrair_info_cartorio devolveria
+    
+    O endereço consultado, que o endpoint costuma ecoar, nunca vale como resposta. Entre os textos
+    de cartório, vence o de um campo de resultado; depois, o que tem forma de cartório; por fim,
+    qualquer texto com palavra-chave.
+    """
+    try:
+        dados = json.loads(conteudo)
+    except (TypeError, ValueError):
+        dados = conteudo or ''
+    eco = normalizar_endereco(consulta) if consulta else None
+    
+    # Percorre o JSON guardando cada texto de cartório com a chave em que apareceu
+    melhor = None
+    pilha = [(None, dados)]
+    while pilha:
+        chave, item = pilha.pop(0)
+        if isinstance(item, dict):
+            pilha.extend(item.items())
+        elif isinstance(item, list):
+            pilha.extend((chave, valor) for valor in item)
+        elif isinstance(item, str):
+            if eco is not None and normalizar_endereco(item) == eco:
+                continue
+            # O bloco volta inteiro, como o innerText do popup
+            texto = _cartorio_do_html(item) if re.search(r'<[a-zA-Z]', item) else item.strip()
+            if not texto or not texto_e_cartorio(texto):
+                continue
+            if isinstance(chave, str) and chave.lower() in CAMPOS_RESULTADO_ONR:
+                prioridade = 0
+            elif REGEX_FORMA_CARTORIO.search(texto):
+                prioridade = 1
+            else:
+                prioridade = 2
+            if melhor is None or prioridade < melhor[0]:
+                melhor = (prioridade, texto)
+    
+    if melhor is not None:
+        return limpar_texto_cartorio(melhor[1])
+    return "❌ Nenhuma informação de cartório encontrada"
+
+
+def ler_resultados(arquivo):
+    """Lê um arquivo de saída enderecos_cartorios_* em CSV ou Parquet"""
+    if arquivo.endswith(".parquet"):
+        return pd.read_parquet(arquivo)
+    return pd.read_csv(arquivo, dtype=str)
+
+
+def resultados_consultados(df):
+    """Descarta as linhas deduzidas pelo índice de CEP, para que não voltem ao cache nem ao índice como consultas"""
+    if 'origem' not in df.columns:
+        return df
+    return df[~df['origem'].isin(ORIGENS_INDICE)]
+
+
+def planejar_consultas(enderecos, posicoes=None):
+    """Agrupa as posições que têm o mesmo endereço normalizado (uma consulta por grupo)"""
+    if posicoes is None:
+        posicoes = range(len(enderecos))
+    grupos = {}
+    for posicao in posicoes:
+        grupos.setdefault(chave_endereco(enderecos[posicao]), []).append(posicao)
+    return grupos
+
+
+def interpretar_shard(texto):
+    """Converte 'i/N' em (i, N), com shards numerados de 1 a N"""
+    try:
+        numero, total = (int(parte) for parte in texto.split("/"))
+    except ValueError:
+        raise ValueError(f"Shard inválido: {texto!r} (use i/N, por exemplo 2/4)")
+    if total < 1 or not 1 <= numero <= total:
+        raise ValueError(f"Shard inválido: {texto!r} (i deve estar entre 1 e N)")
+    return numero, total
+
+
+def indice_shard(endereco, total_shards):
+    """Shard (1 a total_shards) de um endereço, estável entre máquinas; duplicatas caem juntas"""
+    resumo = hashlib.md5(chave_endereco(endereco).encode('utf-8')).digest()
+    return int.from_bytes(resumo[:8], 'big') % total_shards + 1
+
+
+class Metricas:
+    """Tempos por fase da execução, com exportação em JSON/CSV e no formato texto do Prometheus"""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.duracoes = {}
+    
+    def registrar(self, fase, segundos):
+        with self.lock:
+            self.duracoes.setdefault(fase, []).append(segundos)
+    
+    @contextlib.contextmanager
+    def medir(self, fase):
+        """Mede a duração do bloco `with` na fase indicada"""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar(fase, time.perf_counter() - inicio)
+    
+    def limpar(self):
+        with self.lock:
+            self.duracoes = {}
+    
+    def resumo(self):
+        """Contagem, total e percentis (em ms) de cada fase"""
+        with self.lock:
+            duracoes = {fase: np.array(valores) for fase, valores in self.duracoes.items()}
+        return {
+            fase: {
+                "contagem": len(valores),
+                "total_s": round(float(valores.sum()), 3),
+                "media_ms": round(float(valores.mean()) * 1000, 1),
+                "p50_ms": round(float(np.percentile(valores, 50)) * 1000, 1),
+                "p95_ms": round(float(np.percentile(valores, 95)) * 1000, 1),
+                "max_ms": round(float(valores.max()) * 1000, 1)
+            }
+            for fase, valores in duracoes.items()
+        }
+    
+    def exportar(self, prefixo):
+        """Grava o resumo da execução em <prefixo>.json e <prefixo>.csv"""
+        resumo = self.resumo()
+        with open(f"{prefixo}.json", 'w', encoding='utf-8') as f:
+            json.dump(resumo, f, indent=2, ensure_ascii=False)
+        pd.DataFrame.from_dict(resumo, orient='index').rename_axis('fase').to_csv(f"{prefixo}.csv")
+        return f"{prefixo}.json", f"{prefixo}.csv"
+    
+    def texto_prometheus(self):
+        """Resumo no formato de exposição em texto do Prometheus"""
+        linhas = [
+            "# HELP cartorio_fase_segundos Duração das fases do scraper de cartórios",
+            "# TYPE cartorio_fase_segundos summary"
+        ]
+        for fase, dados in self.resumo().items():
+            linhas.append(f'cartorio_fase_segundos{{fase="{fase}",quantile="0.5"}} {dados["p50_ms"] / 1000}')
+            linhas.append(f'cartorio_fase_segundos{{fase="{fase}",quantile="0.95"}} {dados["p95_ms"] / 1000}')
+            linhas.append(f'cartorio_fase_segundos_sum{{fase="{fase}"}} {dados["total_s"]}')
+            linhas.append(f'cartorio_fase_segundos_count{{fase="{fase}"}} {dados["contagem"]}')
+        return "\n".join(linhas) + "\n"
+    
+    def servir_prometheus(self, porta, host="127.0.0.1"):
+        """Expõe /metrics em uma thread de fundo e retorna o servidor"""
+        metricas = self
+        
+        class ManipuladorMetricas(BaseHTTPRequestHandler):
+            def do_GET(self):
+                corpo = metricas.texto_prometheus().encode('utf-8')
+                self.send_response(200 if self.path == "/metrics" else 404)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(corpo)))
+                self.end_headers()
+                self.wfile.write(corpo)
+            
+            def log_message(self, formato, *args):
+                pass
+        
+        servidor = ThreadingHTTPServer((host, porta), ManipuladorMetricas)
+        threading.Thread(target=servidor.serve_forever, name="metricas", daemon=True).start()
+        logger.info(f"Métricas Prometheus em http://{host}:{porta}/metrics")
+        return servidor
+
+
+METRICAS = Metricas()
+
+
+def cronometrado(fase):
+    """Decorador que registra a duração do método em METRICAS com o nome da fase"""
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def envoltorio(*args, **kwargs):
+            with METRICAS.medir(fase):
+                return funcao(*args, **kwargs)
+        return envoltorio
+    return decorador
+
+
+class ControladorTaxa:
+    """Balde de fichas com ajuste AIMD da taxa de consultas, compartilhado entre as sessões
+    
+    A taxa (consultas por segundo) sobe em passos fixos enquanto as buscas dão certo com
+    latência abaixo do alvo e cai pela metade em erros, timeouts ou respostas vazias.
+    """
+    
+    def __init__(self, taxa_inicial=1.0, taxa_min=0.1, taxa_max=10.0, incremento=0.1,
+                 fator_reducao=0.5, latencia_alvo=5.0, rajada=1):
+        self.taxa_min = taxa_min
+        self.taxa_max = max(taxa_max, taxa_min)
+        self.taxa = min(max(taxa_inicial, self.taxa_min), self.taxa_max)
+        self.incremento = incremento
+        self.fator_reducao = fator_reducao
+        self.latencia_alvo = latencia_alvo
+        self.rajada = rajada
+        self.fichas = float(rajada)
+        self.lock = threading.Lock()
+        self.ultima_reposicao = time.monotonic()
+        self.ultima_reducao = 0.0
+        self.inicio = time.monotonic()
+        self.sucessos = 0
+        self.falhas = 0
+        self.reducoes = 0
+    
+    def reservar(self):
+        """Tenta retirar uma ficha; retorna 0 se conseguiu ou quantos segundos esperar antes de tentar de novo
+        
+        Não dorme: quem chama usa time.sleep ou asyncio.sleep conforme o motor. A espera não
+        reserva vaga, então uma redução da taxa vale também para quem já estava esperando.
+        """
+        with self.lock:
+            agora = time.monotonic()
+            self.fichas = min(self.rajada, self.fichas + (agora - self.ultima_reposicao) * self.taxa)
+            self.ultima_reposicao = agora
+            if self.fichas >= 1:
+                self.fichas -= 1
+                return 0.0
+            return (1 - self.fichas) / self.taxa
+    
+    def aguardar(self):
+        """Bloqueia a thread até obter uma ficha"""
+        espera = self.reservar()
+        while espera > 0:
+            time.sleep(espera)
+            espera = self.reservar()
+    
+    def registrar(self, sucesso, latencia):
+        """Ajusta a taxa conforme o resultado e a latência (s) da última consulta"""
+        with self.lock:
+            if sucesso:
+                self.sucessos += 1
+                if latencia <= self.latencia_alvo:
+                    self.taxa = min(self.taxa_max, self.taxa + self.incremento)
+                return
+            
+            self.falhas += 1
+            agora = time.monotonic()
+            # Falhas simultâneas de várias sessões contam como um único sinal de sobrecarga
+            if agora - self.ultima_reducao < 1 / self.taxa:
+                return
+            self.ultima_reducao = agora
+            self.reducoes += 1
+            self.taxa = max(self.taxa_min, self.taxa * self.fator_reducao)
+            taxa = self.taxa
+        logger.warning(f"🐢 Falha na consulta: taxa reduzida para {taxa:.2f} consultas/s")
+    
+    def resumo(self):
+        """Taxa atual e taxa média efetivamente alcançada desde o início"""
+        with self.lock:
+            consultas = self.sucessos + self.falhas
+            decorrido = time.monotonic() - self.inicio
+            return {
+                "consultas": consultas,
+                "sucessos": self.sucessos,
+                "falhas": self.falhas,
+                "reducoes": self.reducoes,
+                "taxa_atual": round(self.taxa, 2),
+                "taxa_media": round(consultas / decorrido, 2) if decorrido > 0 else 0.0
+            }
+
+
+class DiarioCheckpoint:
+    """Diário append-only (JSONL) dos resultados, para retomar o processamento após uma falha"""
+    
+    def __init__(self, arquivo_csv, sufixo=""):
+        self.caminho = f"{os.path.splitext(arquivo_csv)[0]}{sufixo}.diario.jsonl"
+        self.concluidos = self._ler()
+        self.pendentes_gravacao = []
+        self.arquivo = open(self.caminho, 'a', encoding='utf-8')
+    
+    def _ler(self):
+        """Lê os resultados de sucesso já registrados, indexados pela linha do CSV"""
+        concluidos = {}
+        if not os.path.exists(self.caminho):
+            return concluidos
+        
+        with open(self.caminho, 'r', encoding='utf-8') as f:
+            for numero, linha in enumerate(f, 1):
+                try:
+                    registro = json.loads(linha)
+                except json.JSONDecodeError:
+                    # Última linha pode ter ficado pela metade na queda
+                    logger.warning(f"Diário: linha {numero} inválida ignorada")
+                    continue
+                if registro['cartorio'].startswith("❌"):
+                    concluidos.pop(registro['linha'], None)
+                else:
+                    concluidos[registro['linha']] = (registro['chave'], registro['cartorio'])
+        return concluidos
+    
+    def resultado(self, linha, endereco):
+        """Retorna o resultado registrado da linha, se o endereço ainda for o mesmo"""
+        registro = self.concluidos.get(linha)
+        if registro and registro[0] == chave_endereco(endereco):
+            return registro[1]
+        return None
+    
+    def registrar(self, linha, endereco, cartorio):
+        """Acrescenta um resultado ao lote que será gravado no próximo salvar()"""
+        registro = {'linha': int(linha), 'chave': chave_endereco(endereco), 'cartorio': cartorio}
+        self.pendentes_gravacao.append(json.dumps(registro, ensure_ascii=False) + "\n")
+    
+    def salvar(self):
+        """Grava o lote pendente no fim do diário e força a ida para o disco"""
+        if not self.pendentes_gravacao:
+            return
+        self.arquivo.write(''.join(self.pendentes_gravacao))
+        self.arquivo.flush()
+        os.fsync(self.arquivo.fileno())
+        self.pendentes_gravacao = []
+    
+    def fechar(self, remover=False):
+        """Grava o que falta e fecha o diário; remover=True apaga o arquivo (execução concluída)"""
+        self.salvar()
+        self.arquivo.close()
+        if remover or os.path.getsize(self.caminho) == 0:
+            os.remove(self.caminho)
+
+
+class EscritorResultados:
+    """Grava os resultados em lotes à medida que ficam prontos, em CSV ou Parquet (um row group por lote)"""
+    
+    def __init__(self, caminho, formato="csv"):
+        if formato not in ("csv", "parquet"):
+            raise ValueError(f"Formato de saída desconhecido: {formato}")
+        if formato == "parquet" and pq is None:
+            raise ImportError("A saída em Parquet precisa do pacote 'pyarrow' (pip install pyarrow)")
+        self.caminho = caminho
+        self.formato = formato
+        self.linhas = 0
+        self._parquet = None
+        self._vazio = None
+    
+    def escrever(self, df):
+        """Acrescenta um lote com a coluna 'cartorio', já com as colunas tipadas do cartório"""
+        df = pd.concat([df.drop(columns=COLUNAS_CARTORIO, errors='ignore'), separar_cartorio(df['cartorio'])], axis=1)
+        
+        if self.formato == "csv":
+            # O cabeçalho acompanha o primeiro lote gravado
+            df.to_csv(self.caminho, index=False, mode='w' if self.linhas == 0 else 'a', header=self.linhas == 0)
+        elif df.empty:
+            self._vazio = df
+            return
+        else:
+            if self._parquet is None:
+                # Colunas inteiramente vazias no primeiro lote viram texto, não o tipo nulo
+                esquema = pa.Schema.from_pandas(df, preserve_index=False)
+                for i, campo in enumerate(esquema):
+                    if pa.types.is_null(campo.type):
+                        esquema = esquema.set(i, pa.field(campo.name, pa.string()))
+                self._parquet = pq.ParquetWriter(self.caminho, esquema)
+            tabela = pa.Table.from_pandas(df, schema=self._parquet.schema, preserve_index=False)
+            self._parquet.write_table(tabela)
+        self.linhas += len(df)
+    
+    def fechar(self):
+        """Finaliza o arquivo (no Parquet, grava o rodapé com os metadados)"""
+        if self._parquet is not None:
+            self._parquet.close()
+            self._parquet = None
+        elif self.formato == "parquet" and self.linhas == 0 and self._vazio is not None:
+            self._vazio.to_parquet(self.caminho, index=False)
+
+
+class CacheCartorios:
+    """Cache local (SQLite) das respostas do ONR por endereço normalizado e CEP"""
+    
+    def __init__(self, caminho="cartorio_cache.sqlite", ttl_dias=30):
+        self.caminho = caminho
+        self.ttl_segundos = ttl_dias * 86400
+        self.lock = threading.Lock()
+        self.conexao = sqlite3.connect(caminho, check_same_thread=False)
+        self.conexao.execute("""
+            CREATE TABLE IF NOT EXISTS cartorios (
+                chave TEXT PRIMARY KEY,
+                cep TEXT,
+                endereco TEXT,
+                cartorio TEXT,
+                consultado_em REAL
+            )
+        """)
+        self.conexao.execute("CREATE INDEX IF NOT EXISTS idx_cartorios_cep ON cartorios (cep)")
+        self.conexao.commit()
+    
+    def obter(self, endereco):
+        """Retorna o cartório em cache para o endereço, ou None se ausente/expirado"""
+        limite = time.time() - self.ttl_segundos
+        with self.lock:
+            linha = self.conexao.execute(
+                "SELECT cartorio FROM cartorios WHERE chave = ? AND consultado_em >= ?",
+                (chave_endereco(endereco), limite)
+            ).fetchone()
+        return linha[0] if linha else None
+    
+    def salvar(self, endereco, cartorio, consultado_em=None):
+        """Guarda um resultado de sucesso no cache (erros nunca são guardados)"""
+        if not cartorio or cartorio.startswith("❌"):
+            return False
+        with self.lock:
+            self.conexao.execute(
+                "INSERT OR REPLACE INTO cartorios VALUES (?, ?, ?, ?, ?)",
+                (chave_endereco(endereco), extrair_cep(endereco), endereco, cartorio,
+                 consultado_em or time.time())
+            )
+            self.conexao.commit()
+        return True
+    
+    def resultados(self):
+        """Resultados de sucesso dentro do TTL, para montar o índice de CEP"""
+        limite = time.time() - self.ttl_segundos
+        with self.lock:
+            linhas = self.conexao.execute(
+                "SELECT endereco, cartorio FROM cartorios WHERE cep != '' AND consultado_em >= ?", (limite,)
+            ).fetchall()
+        return pd.DataFrame(linhas, columns=["endereco_completo", "cartorio"])
+    
+    def importar_csv(self, arquivo):
+        """Alimenta o cache com um arquivo de saída enderecos_cartorios_* (CSV ou Parquet)"""
+        df = ler_resultados(arquivo)
+        if 'endereco_completo' not in df.columns or 'cartorio' not in df.columns:
+            raise ValueError(f"{arquivo} não tem as colunas 'endereco_completo' e 'cartorio'")
+        df = resultados_consultados(df)
+        # Linhas servidas pelo cache já estão nele com a data da consulta original; reimportá-las
+        # com a data do arquivo esticaria o TTL sem nova consulta ao ONR
+        if 'origem' in df.columns:
+            df = df[df['origem'] != 'cache']
+        
+        # A data do arquivo vale como data da consulta, para o TTL continuar fazendo sentido
+        consultado_em = os.path.getmtime(arquivo)
+        registros = [
+            (chave_endereco(endereco), extrair_cep(endereco), endereco, cartorio, consultado_em)
+            for endereco, cartorio in zip(df['endereco_completo'], df['cartorio'])
+            if isinstance(endereco, str) and isinstance(cartorio, str) and not cartorio.startswith("❌")
+        ]
+        with self.lock:
+            self.conexao.executemany("INSERT OR REPLACE INTO cartorios VALUES (?, ?, ?, ?, ?)", registros)
+            self.conexao.commit()
+        
+        logger.info(f"Cache: {len(registros)} resultados importados de {arquivo}")
+        return len(registros)
+    
+    def fechar(self):
+        """Fecha a conexão com o banco do cache"""
+        with self.lock:
+            self.conexao.close()
+
+
+class IndiceCEP:
+    """Índice compacto CEP → cartório montado a partir de resultados anteriores, com contagens de confiança
+    
+    Guarda arrays ordenados por CEP (8 dígitos) e por prefixo de 5 dígitos, consultados com busca
+    binária. Só responde CEPs em que os resultados concordam; os ambíguos continuam indo ao ONR.
+    CEPs nunca vistos só são deduzidos pelo prefixo com usar_prefixo; por padrão vão ao ONR.
+    """
+    
+    NIVEIS = ("cep", "prefixo")
+    CAMPOS = ("chaves", "codigos", "votos", "totais")
+    
+    def __init__(self, niveis, cartorios, min_ocorrencias=2, min_ocorrencias_prefixo=5, confianca_min=1.0,
+                 usar_prefixo=False):
+        # {nível: {campo: array}}: chaves ordenadas, cartório mais votado, votos dele e total de votos
+        self.niveis = niveis
+        self.cartorios = cartorios
+        self.min_ocorrencias = min_ocorrencias
+        self.min_ocorrencias_prefixo = min_ocorrencias_prefixo
+        # Fração mínima dos resultados que precisa apontar o mesmo cartório (1.0 = unanimidade)
+        self.confianca_min = confianca_min
+        self.usar_prefixo = usar_prefixo
+    
+    def __len__(self):
+        return len(self.niveis["cep"]["chaves"])
+    
+    @staticmethod
+    def _agregar(chaves, codigos):
+        """Conta os votos de cada cartório por chave e fica com o mais votado"""
+        contagens = pd.DataFrame({"chave": chaves, "codigo": codigos}).value_counts().rename("votos").reset_index()
+        contagens["total"] = contagens.groupby("chave")["votos"].transform("sum")
+        melhores = contagens.sort_values(["chave", "votos"], ascending=[True, False]).drop_duplicates("chave")
+        return {
+            "chaves": melhores["chave"].to_numpy(np.int64),
+            "codigos": melhores["codigo"].to_numpy(np.int32),
+            "votos": melhores["votos"].to_numpy(np.int32),
+            "totais": melhores["total"].to_numpy(np.int32)
+        }
+    
+    @classmethod
+    def construir(cls, resultados, **kwargs):
+        """Monta o índice a partir de um DataFrame com 'endereco_completo' e 'cartorio'"""
+        resultados = resultados.dropna(subset=["endereco_completo", "cartorio"])
+        # Mesmo endereço vindo do cache e de um CSV antigo conta uma vez só
+        resultados = resultados.drop_duplicates(["endereco_completo", "cartorio"])
+        resultados = resultados[~resultados["cartorio"].str.startswith("❌")]
+        
+        digitos = resultados["endereco_completo"].str.extract(REGEX_CEP)
+        validos = digitos.notna().all(axis=1)
+        ceps = (digitos.loc[validos, 0] + digitos.loc[validos, 1]).astype(np.int64).to_numpy()
+        codigos, cartorios = pd.factorize(resultados.loc[validos, "cartorio"])
+        
+        niveis = {"cep": cls._agregar(ceps, codigos), "prefixo": cls._agregar(ceps // 1000, codigos)}
+        return cls(niveis, np.asarray(cartorios, dtype=str), **kwargs)
+    
+    def salvar(self, caminho):
+        """Grava o índice em um .npz compactado"""
+        arrays = {f"{nivel}_{campo}": self.niveis[nivel][campo] for nivel in self.NIVEIS for campo in self.CAMPOS}
+        np.savez_compressed(caminho, cartorios=self.cartorios, **arrays)
+    
+    @classmethod
+    def carregar(cls, caminho, **kwargs):
+        """Lê um índice gravado por salvar()"""
+        with np.load(caminho) as dados:
+            niveis = {nivel: {campo: dados[f"{nivel}_{campo}"] for campo in cls.CAMPOS} for nivel in cls.NIVEIS}
+            return cls(niveis, dados["cartorios"], **kwargs)
+    
+    def _buscar(self, nivel, chaves, min_ocorrencias):
+        """Busca binária das chaves em um nível: (encontradas, confiáveis, códigos dos cartórios)"""
+        arrays = self.niveis[nivel]
+        if len(arrays["chaves"]) == 0:
+            nada = np.zeros(len(chaves), dtype=bool)
+            return nada, nada, np.zeros(len(chaves), dtype=np.int32)
+        
+        posicoes = np.minimum(np.searchsorted(arrays["chaves"], chaves), len(arrays["chaves"]) - 1)
+        encontradas = (arrays["chaves"][posicoes] == chaves) & (chaves >= 0)
+        totais = arrays["totais"][posicoes]
+        confiaveis = (
+            encontradas
+            & (totais >= min_ocorrencias)
+            & (arrays["votos"][posicoes] >= self.confianca_min * totais)
+        )
+        return encontradas, confiaveis, arrays["codigos"][posicoes]
+    
+    def consultar(self, ceps):
+        """Para cada CEP (texto só com dígitos, ou vazio), devolve (cartório, nível) ou (None, None)"""
+        chaves = np.array([int(cep) if cep else -1 for cep in ceps], dtype=np.int64)
+        encontradas, confiaveis, codigos = self._buscar("cep", chaves, self.min_ocorrencias)
+        
+        # Com usar_prefixo, CEP nunca visto recorre ao prefixo; CEP já visto com resultados divergentes vai ao ONR
+        _, confiaveis_prefixo, codigos_prefixo = self._buscar(
+            "prefixo", np.where(chaves >= 0, chaves // 1000, -1), self.min_ocorrencias_prefixo
+        )
+        usar_prefixo = ~encontradas & confiaveis_prefixo & self.usar_prefixo
+        
+        respostas = []
+        for i in range(len(chaves)):
+            if confiaveis[i]:
+                respostas.append((str(self.cartorios[codigos[i]]), "cep"))
+            elif usar_prefixo[i]:
+                respostas.append((str(self.cartorios[codigos_prefixo[i]]), "prefixo"))
+            else:
+                respostas.append((None, None))
+        return respostas
+
+
+class BackendConsulta(abc.ABC):
+    """Interface comum das sessões de consulta usadas pelo PoolSessoes"""
+    
+    @abc.abstractmethod
+    def iniciar_sessao(self):
+        """Prepara a sessão para consultas; retorna True se ficou pronta"""
+    
+    @abc.abstractmethod
+    def buscar_endereco(self, endereco):
+        """Consulta um endereço e retorna o texto do cartório ou uma mensagem '❌ ...'"""
+    
+    @abc.abstractmethod
+    def sessao_ativa(self):
+        """Indica se a sessão ainda está utilizável"""
+    
+    def memoria_mb(self):
+        """Memória residente usada pela sessão em MB, ou None se não for mensurável"""
+        return None
+    
+    def definir_timeout(self, timeout):
+        """Ajusta a espera máxima pelo resultado das próximas buscas (ignorado se não configurável)"""
+    
+    @abc.abstractmethod
+    def encerrar_sessao(self):
+        """Libera os recursos da sessão"""
+
+
+class BackendHTTP(BackendConsulta):
+    """Consulta direta ao endpoint HTTP que o frontend do mapa chama, sem navegador"""
+    
+    def __init__(self, url_api, parametro="endereco", timeout=15, tamanho_pool=4):
+        self.url_api = url_api
+        self.parametro = parametro
+        self.timeout = timeout
+        self.tamanho_pool = tamanho_pool
+        self.sessao = None
+    
+    def definir_timeout(self, timeout):
+        """Ajusta o timeout das próximas requisições"""
+        self.timeout = timeout
+    
+    def iniciar_sessao(self):
+        """Abre uma sessão HTTP keep-alive com pool de conexões"""
+        if requests is None:
+            raise ImportError("O backend HTTP precisa do pacote 'requests' (pip install requests)")
+        
+        self.sessao = requests.Session()
+        adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=self.tamanho_pool, max_retries=1)
+        self.sessao.mount("http://", adaptador)
+        self.sessao.mount("https://", adaptador)
+        self.sessao.headers.update({
+            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
+            "Accept": "application/json, text/plain, */*"
+        })
+        logger.info(f"Sessão HTTP configurada: {self.url_api}")
+        return True
+    
+    @cronometrado("buscar_endereco")
+    def buscar_endereco(self, endereco):
+        """Busca um endereço no endpoint de consulta"""
+        try:
+            logger.info(f"Buscando (HTTP): {endereco}")
+            resposta = self.sessao.get(self.url_api, params={self.parametro: endereco}, timeout=self.timeout)
+            resposta.raise_for_status()
+            
+            info_cartorio = interpretar_resposta_onr(resposta.text, endereco)
+            logger.info(f"Resultado: {info_cartorio[:100]}...")
+            return info_cartorio
+            
+        except Exception as e:
+            erro = f"❌ Erro na busca: {str(e)}"
+            logger.error(erro)
+            return erro
+    
+    def sessao_ativa(self):
+        """A sessão HTTP fica utilizável enquanto não for encerrada"""
+        return self.sessao is not None
+    
+    def encerrar_sessao(self):
+        """Fecha as conexões da sessão HTTP"""
+        if self.sessao is not None:
+            self.sessao.close()
+            self.sessao = None
+
+
+class PoolSessoes:
+    """Pool de sessões independentes do Chrome consumindo uma fila compartilhada de endereços"""
+    
+    def __init__(self, fabrica_sessao, num_sessoes=1, pausa_entre_buscas=3, controlador=None,
+                 reciclar_apos=None, limite_memoria_mb=None, intervalo_memoria=10, num_abas=1):
+        self.fabrica_sessao = fabrica_sessao
+        self.num_sessoes = max(1, int(num_sessoes))
+        self.pausa_entre_buscas = pausa_entre_buscas
+        # Controlador de taxa compartilhado (None usa a pausa fixa entre buscas)
+        self.controlador = controlador
+        # Recicla a sessão após N buscas ou acima do limite de memória (None desativa)
+        self.reciclar_apos = reciclar_apos
+        self.limite_memoria_mb = limite_memoria_mb
+        # A memória é medida a cada intervalo_memoria buscas da sessão
+        self.intervalo_memoria = intervalo_memoria
+        # Abas por navegador, cada uma com uma busca em andamento (1 busca e espera em sequência)
+        self.num_abas = max(1, int(num_abas))
+        self.sessoes = [None] * self.num_sessoes
+        self.buscas = [0] * self.num_sessoes
+        # Espera máxima imposta às sessões (None mantém a da fábrica)
+        self.timeout = None
+        self.lock = threading.Lock()
+    
+    def _obter_sessao(self, indice):
+        """Retorna a sessão do trabalhador, criando e aquecendo o navegador se necessário"""
+        sessao = self.sessoes[indice]
+        if sessao is not None:
+            return sessao
+        
+        sessao = self.fabrica_sessao()
+        try:
+            if self.timeout is not None:
+                sessao.definir_timeout(self.timeout)
+            if not sessao.iniciar_sessao():
+                logger.error(f"❌ Sessão {indice + 1}: falha ao carregar o mapa")
+                sessao.encerrar_sessao()
+                return None
+            if self.num_abas > 1:
+                abas = sessao.abrir_abas(self.num_abas)
+                logger.info(f"🗂️  Sessão {indice + 1}: {len(abas)} abas prontas")
+        except Exception as e:
+            logger.error(f"❌ Sessão {indice + 1}: erro ao iniciar navegador: {e}")
+            sessao.encerrar_sessao()
+            return None
+        
+        logger.info(f"✅ Sessão {indice + 1} pronta")
+        self.sessoes[indice] = sessao
+        return sessao
+    
+    def _descartar_sessao(self, indice):
+        """Fecha e remove do pool a sessão de um trabalhador"""
+        sessao = self.sessoes[indice]
+        self.sessoes[indice] = None
+        self.buscas[indice] = 0
+        if sessao is not None:
+            sessao.encerrar_sessao()
+    
+    def _precisa_reciclar(self, indice, sessao):
+        """Indica se a sessão atingiu o limite de buscas ou de memória"""
+        buscas = self.buscas[indice]
+        if self.reciclar_apos and buscas >= self.reciclar_apos:
+            logger.info(f"♻️  Sessão {indice + 1}: reciclando após {buscas} buscas")
+            return True
+        if self.limite_memoria_mb and buscas % self.intervalo_memoria == 0:
+            memoria = sessao.memoria_mb()
+            if memoria is not None and memoria > self.limite_memoria_mb:
+                logger.info(f"♻️  Sessão {indice + 1}: reciclando com {memoria:.0f} MB após {buscas} buscas")
+                return True
+        return False
+    
+    def _trabalhador(self, indice, fila, resultados, ao_concluir):
+        """Consome endereços da fila, recriando o navegador quando ele cai ou precisa ser reciclado"""
+        if self.num_abas > 1:
+            return self._trabalhador_em_abas(indice, fila, resultados, ao_concluir)
+        
+        while True:
+            try:
+                posicao, endereco, tentativas = fila.get_nowait()
+            except queue.Empty:
+                return
+            
+            while True:
+                sessao = self._obter_sessao(indice)
+                if sessao is None:
+                    # Sem navegador neste trabalhador: o endereço volta para as outras sessões
+                    fila.put((posicao, endereco, tentativas))
+                    return
+                
+                if self.controlador:
+                    self.controlador.aguardar()
+                inicio = time.perf_counter()
+                try:
+                    resultado = sessao.buscar_endereco(endereco)
+                    perdida = resultado.startswith("❌") and not sessao.sessao_ativa()
+                except Exception as e:
+                    # Exceção que escapou da busca: a sessão é tratada como perdida, sem derrubar o trabalhador
+                    logger.error(f"❌ Sessão {indice + 1}: erro inesperado na busca: {e}")
+                    resultado, perdida = f"❌ Erro na busca: {e}", True
+                self.buscas[indice] += 1
+                
+                # Um erro pode significar que o navegador caiu: recria a sessão e repete o endereço
+                if perdida:
+                    self._descartar_sessao(indice)
+                    if tentativas < 1:
+                        logger.warning(f"⚠️  Sessão {indice + 1} perdeu o navegador, recriando e repetindo o endereço")
+                        tentativas += 1
+                        continue
+                    logger.error(f"❌ Sessão {indice + 1} perdeu o navegador de novo, desistindo do endereço")
+                break
+            
+            if self.controlador:
+                self.controlador.registrar(not resultado.startswith("❌"), time.perf_counter() - inicio)
+            self._registrar(posicao, resultado, resultados, ao_concluir)
+            
+            if self.sessoes[indice] is not None and self._precisa_reciclar(indice, sessao):
+                self._descartar_sessao(indice)
+            
+            # Pausa fixa entre buscas quando não há controlador de taxa
+            if not self.controlador:
+                time.sleep(self.pausa_entre_buscas)
+    
+    def _trabalhador_em_abas(self, indice, fila, resultados, ao_concluir):
+        """Mantém uma busca em andamento por aba do mesmo navegador, enviando na aba livre enquanto as outras esperam"""
+        em_voo = {}  # aba -> (posicao, endereco, tentativas, inicio)
+        sessao = None
+        drenando = False
+        proximo_envio = 0.0
+        
+        while True:
+            if sessao is None:
+                sessao = self._obter_sessao(indice)
+                if sessao is None:
+                    return
+            
+            # Envia um endereço em cada aba livre, sem esperar o popup das anteriores
+            for aba in sessao.abas:
+                if drenando or aba in em_voo:
+                    continue
+                if not self.controlador and time.monotonic() < proximo_envio:
+                    break
+                try:
+                    posicao, endereco, tentativas = fila.get_nowait()
+                except queue.Empty:
+                    break
+                
+                if self.controlador:
+                    self.controlador.aguardar()
+                else:
+                    proximo_envio = time.monotonic() + self.pausa_entre_buscas
+                em_voo[aba] = (posicao, endereco, tentativas, time.perf_counter())
+                erro = sessao.enviar_busca(aba, endereco)
+                self.buscas[indice] += 1
+                if erro:
+                    sessao = self._concluir_aba(indice, sessao, aba, erro, em_voo, fila, resultados, ao_concluir)
+                    if sessao is None:
+                        break
+            
+            if sessao is None:
+                drenando = False
+                continue
+            if not em_voo:
+                if drenando:
+                    # Todas as abas terminaram: agora a sessão pode ser reciclada
+                    self._descartar_sessao(indice)
+                    sessao, drenando = None, False
+                if fila.empty():
+                    return
+                # Abas livres aguardando a pausa fixa antes do próximo envio
+                time.sleep(max(0.0, proximo_envio - time.monotonic()))
+                continue
+            
+            # Passa pelas abas ocupadas lendo o resultado de cada uma sem bloquear
+            concluiu = False
+            for aba in list(em_voo):
+                resultado = sessao.ler_busca(aba)
+                if resultado is None:
+                    continue
+                concluiu = True
+                sessao = self._concluir_aba(indice, sessao, aba, resultado, em_voo, fila, resultados, ao_concluir)
+                if sessao is None:
+                    break
+                if not drenando and self._precisa_reciclar(indice, sessao):
+                    drenando = True
+            
+            if sessao is None:
+                drenando = False
+            elif not concluiu:
+                time.sleep(0.05)
+    
+    def _concluir_aba(self, indice, sessao, aba, resultado, em_voo, fila, resultados, ao_concluir):
+        """Registra o resultado da aba; se o navegador caiu, devolve à fila as buscas de todas as abas"""
+        posicao, endereco, tentativas, inicio = em_voo.pop(aba)
+        duracao = time.perf_counter() - inicio
+        METRICAS.registrar("buscar_endereco", duracao)
+        
+        if resultado.startswith("❌") and not sessao.sessao_ativa():
+            self._descartar_sessao(indice)
+            # As outras abas perderam a busca junto com o navegador, sem culpa do endereço
+            for outra_posicao, outro_endereco, outras_tentativas, _ in em_voo.values():
+                fila.put((outra_posicao, outro_endereco, outras_tentativas))
+            em_voo.clear()
+            if tentativas < 1:
+                logger.warning(f"⚠️  Sessão {indice + 1} perdeu o navegador, recriando e repetindo os endereços das abas")
+                fila.put((posicao, endereco, tentativas + 1))
+                return None
+            logger.error(f"❌ Sessão {indice + 1} perdeu o navegador de novo, desistindo do endereço")
+            sessao = None
+        
+        if self.controlador:
+            self.controlador.registrar(not resultado.startswith("❌"), duracao)
+        self._registrar(posicao, resultado, resultados, ao_concluir)
+        return sessao
+    
+    def _registrar(self, posicao, resultado, resultados, ao_concluir):
+        """Guarda o resultado na posição de entrada e notifica o chamador"""
+        with self.lock:
+            resultados[posicao] = resultado
+            if ao_concluir:
+                ao_concluir(posicao, resultado)
+    
+    def processar(self, enderecos, ao_concluir=None):
+        """Processa os endereços nas sessões do pool, devolvendo resultados na ordem de entrada"""
+        enderecos = list(enderecos)
+        resultados = [None] * len(enderecos)
+        if not enderecos:
+            return resultados
+        
+        fila = queue.Queue()
+        for posicao, endereco in enumerate(enderecos):
+            fila.put((posicao, endereco, 0))
+        
+        num_trabalhadores = min(self.num_sessoes, len(enderecos))
+        trabalhadores = [
+            threading.Thread(
+                target=self._trabalhador,
+                args=(i, fila, resultados, ao_concluir),
+                name=f"sessao-{i + 1}",
+                daemon=True
+            )
+            for i in range(num_trabalhadores)
+        ]
+        for t in trabalhadores:
+            t.start()
+        for t in trabalhadores:
+            t.join()
+        
+        # Se todas as sessões caíram, o que sobrou na fila fica marcado como erro
+        for posicao, resultado in enumerate(resultados):
+            if resultado is None:
+                self._registrar(posicao, "❌ Nenhuma sessão do navegador disponível", resultados, ao_concluir)
+        
+        return resultados
+    
+    def definir_timeout(self, timeout):
+        """Ajusta a espera máxima das sessões abertas e das que forem criadas depois"""
+        self.timeout = timeout
+        for sessao in self.sessoes:
+            if sessao is not None:
+                sessao.definir_timeout(timeout)
+    
+    def encerrar(self):
+        """Fecha todos os navegadores do pool"""
+        for indice in range(self.num_sessoes):
+            self._descartar_sessao(indice)
+
+
+class PoolAssincrono:
+    """Motor asyncio que mantém até max_em_voo consultas HTTP em andamento ao mesmo tempo"""
+    
+    def __init__(self, url_api, max_em_voo=20, max_por_host=None, timeout=15, parametro="endereco",
+                 controlador=None):
+        self.url_api = url_api
+        self.max_em_voo = max(1, int(max_em_voo))
+        # Limite de conexões simultâneas a um mesmo host (None usa max_em_voo)
+        self.max_por_host = max_por_host or self.max_em_voo
+        self.timeout = timeout
+        self.parametro = parametro
+        # Controlador de taxa compartilhado (None não limita a taxa)
+        self.controlador = controlador
+    
+    async def _consultar(self, sessao, endereco):
+        """Consulta um endereço no endpoint, com a mesma saída do BackendHTTP"""
+        inicio = time.perf_counter()
+        try:
+            async with sessao.get(self.url_api, params={self.parametro: endereco}) as resposta:
+                resposta.raise_for_status()
+                return interpretar_resposta_onr(await resposta.text(), endereco)
+        except Exception as e:
+            erro = f"❌ Erro na busca: {str(e) or type(e).__name__}"
+            logger.error(erro)
+            return erro
+        finally:
+            METRICAS.registrar("buscar_endereco", time.perf_counter() - inicio)
+    
+    async def _processar(self, enderecos, resultados, ao_concluir):
+        """Distribui os endereços entre max_em_voo consumidores de uma fila assíncrona"""
+        fila = asyncio.Queue()
+        for posicao, endereco in enumerate(enderecos):
+            fila.put_nowait((posicao, endereco))
+        
+        # O conector limita as conexões no total e por host
+        conector = aiohttp.TCPConnector(limit=self.max_em_voo, limit_per_host=self.max_por_host)
+        cabecalhos = {
+            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
+            "Accept": "application/json, text/plain, */*"
+        }
+        async with aiohttp.ClientSession(
+            connector=conector,
+            headers=cabecalhos,
+            timeout=aiohttp.ClientTimeout(total=self.timeout)
+        ) as sessao:
+            
+            async def consumidor():
+                while True:
+                    try:
+                        posicao, endereco = fila.get_nowait()
+                    except asyncio.QueueEmpty:
+                        return
+                    if self.controlador:
+                        espera = self.controlador.reservar()
+                        while espera > 0:
+                            await asyncio.sleep(espera)
+                            espera = self.controlador.reservar()
+                    inicio = time.perf_counter()
+                    resultado = await self._consultar(sessao, endereco)
+                    if self.controlador:
+                        self.controlador.registrar(not resultado.startswith("❌"), time.perf_counter() - inicio)
+                    resultados[posicao] = resultado
+                    # Entrega cada resultado assim que fica pronto
+                    if ao_concluir:
+                        ao_concluir(posicao, resultado)
+            
+            await asyncio.gather(*(consumidor() for _ in range(min(self.max_em_voo, len(enderecos)))))
+    
+    def processar(self, enderecos, ao_concluir=None):
+        """Processa os endereços de forma concorrente, devolvendo resultados na ordem de entrada"""
+        if aiohttp is None:
+            raise ImportError("O motor assíncrono precisa do pacote 'aiohttp' (pip install aiohttp)")
+        
+        enderecos = list(enderecos)
+        resultados = [None] * len(enderecos)
+        if enderecos:
+            asyncio.run(self._processar(enderecos, resultados, ao_concluir))
+        return resultados
+    
+    def definir_timeout(self, timeout):
+        """Ajusta o timeout das consultas dos próximos processar()"""
+        self.timeout = timeout
+    
+    def encerrar(self):
+        """As sessões HTTP assíncronas são fechadas ao fim de cada processar()"""
+        pass
+
+
+class ServicoConsultas:
+    """Conjunto de sessões aquecidas e de longa duração para consultas avulsas (modo daemon)"""
+    
+    def __init__(self, fabrica_sessao, num_sessoes=1, cache=None, ocioso_max=900, intervalo_manutencao=30):
+        self.fabrica_sessao = fabrica_sessao
+        self.num_sessoes = max(1, int(num_sessoes))
+        self.cache = cache
+        self.ocioso_max = ocioso_max
+        self.intervalo_manutencao = intervalo_manutencao
+        # Sessões livres aguardando requisições: (sessao, último uso)
+        self.livres = queue.Queue()
+        self.lock = threading.Lock()
+        # Sessões existentes (livres ou em uso); a reposição cria uma de cada vez
+        self.ativas = 0
+        self.reposicao = threading.Lock()
+        self.em_espera = 0
+        self.consultas = 0
+        self.parar = threading.Event()
+        self.manutencao = None
+    
+    def _nova_sessao_aquecida(self):
+        """Cria uma sessão e a aquece; retorna None se não ficou pronta"""
+        sessao = self.fabrica_sessao()
+        try:
+            if sessao.iniciar_sessao():
+                return sessao
+            logger.error("❌ Falha ao aquecer sessão do serviço")
+        except Exception as e:
+            logger.error(f"❌ Erro ao iniciar sessão do serviço: {e}")
+        sessao.encerrar_sessao()
+        return None
+    
+    def _repor_sessao(self):
+        """Cria uma sessão substituta e a devolve ao conjunto de livres"""
+        sessao = self._nova_sessao_aquecida()
+        if sessao is not None:
+            with self.lock:
+                self.ativas += 1
+            self.livres.put((sessao, time.time()))
+        return sessao is not None
+    
+    def _descartar_sessao(self, sessao):
+        """Fecha uma sessão que saiu do conjunto"""
+        with self.lock:
+            self.ativas -= 1
+        try:
+            sessao.encerrar_sessao()
+        except Exception as e:
+            logger.warning(f"⚠️  Erro ao fechar sessão do serviço: {e}")
+    
+    def _completar_sessoes(self):
+        """Recria, uma de cada vez, as sessões que faltam para num_sessoes; para na primeira falha"""
+        with self.reposicao:
+            while self.ativas < self.num_sessoes and not self.parar.is_set():
+                if not self._repor_sessao():
+                    return False
+        return True
+    
+    def iniciar(self):
+        """Aquece as sessões em paralelo e inicia a manutenção em segundo plano"""
+        aquecimento = [
+            threading.Thread(target=self._repor_sessao, name=f"aquecimento-{i + 1}", daemon=True)
+            for i in range(self.num_sessoes)
+        ]
+        for t in aquecimento:
+            t.start()
+        for t in aquecimento:
+            t.join()
+        
+        prontas = self.livres.qsize()
+        if prontas == 0:
+            raise RuntimeError("Nenhuma sessão de consulta pôde ser iniciada")
+        logger.info(f"✅ Serviço com {prontas}/{self.num_sessoes} sessões prontas")
+        
+        self.manutencao = threading.Thread(target=self._manter_sessoes, name="manutencao", daemon=True)
+        self.manutencao.start()
+    
+    def _manter_sessoes(self):
+        """Recicla periodicamente sessões ociosas ou sem resposta e completa o conjunto até num_sessoes"""
+        while not self.parar.wait(self.intervalo_manutencao):
+            verificadas = []
+            while True:
+                try:
+                    verificadas.append(self.livres.get_nowait())
+                except queue.Empty:
+                    break
+            
+            # As sessões saudáveis voltam para a fila antes de qualquer recriação
+            recicladas = []
+            for sessao, ultimo_uso in verificadas:
+                ocioso = time.time() - ultimo_uso > self.ocioso_max
+                if not ocioso and sessao.sessao_ativa():
+                    self.livres.put((sessao, ultimo_uso))
+                else:
+                    recicladas.append((sessao, ocioso))
+            
+            for sessao, ocioso in recicladas:
+                logger.info(f"♻️  Reciclando sessão {'ociosa' if ocioso else 'sem resposta'}")
+                self._descartar_sessao(sessao)
+                self._completar_sessoes()
+            
+            # Repõe também as que caíram em uso ou falharam ao ser recriadas em passagens anteriores
+            if not self._completar_sessoes():
+                logger.warning(f"⚠️  Serviço com {self.ativas}/{self.num_sessoes} sessões; "
+                               f"nova tentativa na próxima manutenção")
+    
+    def consultar(self, endereco, timeout=120):
+        """Consulta um endereço, esperando na fila até uma sessão ficar livre"""
+        if self.cache:
+            em_cache = self.cache.obter(endereco)
+            if em_cache is not None:
+                return em_cache, "cache"
+        
+        with self.lock:
+            self.em_espera += 1
+        try:
+            sessao, _ = self.livres.get(timeout=timeout)
+        except queue.Empty:
+            return "❌ Tempo esgotado aguardando uma sessão livre", "fila"
+        finally:
+            with self.lock:
+                self.em_espera -= 1
+        
+        try:
+            resultado = sessao.buscar_endereco(endereco)
+            perdida = resultado.startswith("❌") and not sessao.sessao_ativa()
+        except Exception as e:
+            logger.error(f"❌ Erro inesperado na consulta: {e}")
+            resultado, perdida = f"❌ Erro na busca: {e}", True
+        with self.lock:
+            self.consultas += 1
+        
+        if perdida:
+            # Sessão morreu: substitui em segundo plano e não bloqueia a resposta
+            self._descartar_sessao(sessao)
+            threading.Thread(target=self._completar_sessoes, daemon=True).start()
+        else:
+            self.livres.put((sessao, time.time()))
+            if self.cache:
+                self.cache.salvar(endereco, resultado)
+        return resultado, "onr"
+    
+    def estado(self):
+        """Resumo do serviço para o endpoint de saúde"""
+        with self.lock:
+            return {
+                "sessoes": self.num_sessoes,
+                "sessoes_ativas": self.ativas,
+                "sessoes_livres": self.livres.qsize(),
+                "requisicoes_em_espera": self.em_espera,
+                "consultas_realizadas": self.consultas
+            }
+    
+    def encerrar(self):
+        """Para a manutenção e fecha todas as sessões livres"""
+        self.parar.set()
+        if self.manutencao:
+            self.manutencao.join()
+        while True:
+            try:
+                sessao, _ = self.livres.get_nowait()
+            except queue.Empty:
+                break
+            self._descartar_sessao(sessao)
+
 
-class CartorioScraperOtimizado:
-    def __init__(self, arquivo_csv, headless=False):
+class CartorioScraperOtimizado(BackendConsulta):
+    def __init__(self, arquivo_csv, headless=False, num_sessoes=1, modo_espera="evento",
+                 timeout_resultado=15, pausa_entre_buscas=None, arquivo_cache="cartorio_cache.sqlite",
+                 ttl_cache_dias=30, reaproveitar_cep=False, tamanho_bloco=None, backend="selenium",
+                 url_api=None, motor="sincrono", max_em_voo=20, max_por_host=None, perfil_enxuto=False,
+                 url_base="https://mapa.onr.org.br", porta_metricas=None, taxa_inicial=1.0, taxa_min=0.1,
+                 taxa_max=10.0, reciclar_apos=500, limite_memoria_mb=1500, shard=None, formato_saida="csv",
+                 lote_saida=500, validar_enderecos=True, arquivo_indice_cep="indice_cep.npz", repeticoes=1,
+                 max_repeticoes=None, fator_espera_repeticao=2, num_abas=1, prefixo_cep=False):
         self.arquivo_csv = arquivo_csv
         self.headless = headless
+        # Bloqueia tiles, imagens, fontes e scripts de terceiros no navegador
+        self.perfil_enxuto = perfil_enxuto
+        self.num_sessoes = num_sessoes
+        # "selenium" (navegador) ou "http" (endpoint de consulta direto)
+        if backend not in ("selenium", "http"):
+            raise ValueError(f"Backend desconhecido: {backend}")
+        self.backend = backend
+        self.url_api = url_api or os.environ.get("ONR_URL_API")
+        if backend == "http" and not self.url_api:
+            raise ValueError("O backend HTTP precisa da URL do endpoint de consulta (--url-api ou ONR_URL_API)")
+        # "sincrono" (pool de sessões) ou "assincrono" (asyncio, só com o backend HTTP)
+        if motor == "assincrono" and backend != "http":
+            raise ValueError("O motor assíncrono requer o backend HTTP")
+        self.motor = motor
+        self.max_em_voo = max_em_voo
+        self.max_por_host = max_por_host
+        # "evento": retorna assim que o resultado aparece; "fixo": pausas fixas originais
+        self.modo_espera = modo_espera
+        self.timeout_resultado = timeout_resultado
+        # Pausa fixa entre buscas; None ajusta a taxa conforme as respostas do ONR
+        if pausa_entre_buscas is None and modo_espera == "fixo":
+            pausa_entre_buscas = 3
+        self.pausa_entre_buscas = pausa_entre_buscas
+        # Limites do controlador de taxa, em consultas por segundo somando todas as sessões
+        self.taxa_inicial = taxa_inicial
+        self.taxa_min = taxa_min
+        self.taxa_max = taxa_max
+        self.controlador = None
+        # Falhas ficam para repetições ao fim de cada bloco, com sessões novas e espera
+        # multiplicada por fator_espera_repeticao; max_repeticoes limita os endereços repetidos na execução
+        self.repeticoes = repeticoes
+        self.max_repeticoes = max_repeticoes
+        self.fator_espera_repeticao = fator_espera_repeticao
+        self._orcamento_repeticoes = None
+        self._recuperadas = 0
+        # Reciclagem do navegador em execuções longas (None desativa cada critério)
+        self.reciclar_apos = reciclar_apos
+        self.limite_memoria_mb = limite_memoria_mb
+        # Cache de consultas anteriores (None desativa)
+        self.arquivo_cache = arquivo_cache
+        self.ttl_cache_dias = ttl_cache_dias
+        self.cache = None
+        # Responde pelo CEP quando o histórico o associa a um único cartório: usa o índice
+        # gravado em arquivo_indice_cep, se existir, ou (com reaproveitar_cep) um montado do cache
+        self.reaproveitar_cep = reaproveitar_cep
+        self.arquivo_indice_cep = arquivo_indice_cep
+        self.indice_cep = None
+        # Deduz CEPs nunca vistos pelo prefixo de 5 dígitos (por padrão eles vão ao ONR)
+        self.prefixo_cep = prefixo_cep
+        # Lê e grava o CSV em blocos deste tamanho (None carrega o arquivo inteiro)
+        self.tamanho_bloco = tamanho_bloco
+        # (i, N): processa só as linhas do shard i de N (execução em várias máquinas)
+        self.shard = shard
+        # Saída gravada em lotes de lote_saida linhas, em CSV ou Parquet
+        self.formato_saida = formato_saida
+        self.lote_saida = max(1, int(lote_saida))
+        self.escritor = None
+        self._prontas = self._gravadas = 0
+        # Valida CEP e UF e corrige colunas deslocadas antes de qualquer consulta
+        self.validar_enderecos = validar_enderecos
+        # Sem gravação, as linhas rejeitadas só são descartadas (releitura da entrada na mesclagem)
+        self.gravar_rejeitados = True
+        self._rejeitados_gravados = 0
+        self._confirmado = False
+        self.diario = None
         self.driver = None
         self.wait = None
-        self.url_base = "https://mapa.onr.org.br"
+        self._campo_busca = None
+        # Abas do mesmo navegador com buscas em andamento ao mesmo tempo (1 desativa)
+        if num_abas > 1 and (backend != "selenium" or modo_espera != "evento"):
+            raise ValueError("Várias abas requerem o backend selenium com modo_espera='evento'")
+        self.num_abas = num_abas
+        self.abas = {}
+        self._aba_atual = None
+        self._em_voo = {}
+        self.url_base = url_base
+        # Porta do endpoint /metrics no formato Prometheus (None desativa)
+        self.porta_metricas = porta_metricas
+        self._servidor_metricas = None
         self.resultados = []
+        self.origens = []
+        self.pool = None
+        # Pool separado das repetições, criado na primeira falha e reaproveitado até o fim da execução
+        self.pool_repeticao = None
         
+    @cronometrado("setup_driver")
     def setup_driver(self):
         """Configura o driver do Chrome otimizado para velocidade"""
         options = Options()
@@ -48,6 +1682,11 @@ class CartorioScraperOtimizado:
         options.add_argument("--disable-plugins")
         options.add_argument("--disable-extensions")
         options.add_argument("--window-size=1366,768")
+        if self.num_abas > 1:
+            # Abas em segundo plano continuam recebendo timers e renderizando os popups
+            options.add_argument("--disable-background-timer-throttling")
+            options.add_argument("--disable-backgrounding-occluded-windows")
+            options.add_argument("--disable-renderer-backgrounding")
         
         # Anti-detecção básica
         options.add_argument("--disable-blink-features=AutomationControlled")
@@ -59,11 +1698,18 @@ class CartorioScraperOtimizado:
         prefs = {
             "profile.default_content_setting_values.notifications": 2
         }
+        if self.perfil_enxuto:
+            # Perfil enxuto: sem imagens e sem esperar subrecursos além do DOM
+            prefs["profile.managed_default_content_settings.images"] = 2
+            options.page_load_strategy = "eager"
         options.add_experimental_option("prefs", prefs)
         
         try:
             self.driver = webdriver.Chrome(options=options)
             self.driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+            if self.perfil_enxuto:
+                self._bloquear_urls()
+                logger.info(f"Perfil enxuto: {len(URLS_BLOQUEADAS_PERFIL_ENXUTO)} padrões de URL bloqueados")
             self.wait = WebDriverWait(self.driver, 30)  # Aumentei o timeout
             logger.info("Driver configurado com sucesso")
             
@@ -71,77 +1717,247 @@ class CartorioScraperOtimizado:
             logger.error(f"Erro ao configurar driver: {e}")
             raise
     
+    def iniciar_sessao(self):
+        """Abre o navegador, acessa o site e aguarda o mapa ficar pronto"""
+        self.setup_driver()
+        self.driver.get(self.url_base)
+        return self.aguardar_mapa_carregado()
+    
+    def sessao_ativa(self):
+        """Verifica se o navegador ainda responde"""
+        if not self.driver:
+            return False
+        try:
+            self.driver.current_url
+            return True
+        except Exception:
+            # Com o chromedriver morto, o selenium levanta erros do urllib3, não WebDriverException
+            return False
+    
+    def memoria_mb(self):
+        """Soma o RSS do chromedriver e dos processos do Chrome abertos por ele"""
+        if psutil is None or not self.driver:
+            return None
+        try:
+            processo = psutil.Process(self.driver.service.process.pid)
+            total = processo.memory_info().rss
+            for filho in processo.children(recursive=True):
+                try:
+                    total += filho.memory_info().rss
+                except psutil.Error:
+                    pass
+            return total / 2**20
+        except (AttributeError, psutil.Error):
+            return None
+    
+    def definir_timeout(self, timeout):
+        """Ajusta a espera pelo popup das próximas buscas"""
+        self.timeout_resultado = timeout
+    
+    def encerrar_sessao(self):
+        """Fecha o navegador desta sessão"""
+        if self.driver:
+            try:
+                self.driver.quit()
+            except Exception as e:
+                logger.debug(f"Erro ao fechar navegador: {e}")
+            self.driver = None
+            self.wait = None
+            self._campo_busca = None
+            self.abas = {}
+            self._em_voo = {}
+    
+    def _nova_sessao(self, timeout_resultado=None):
+        """Cria uma nova sessão do backend escolhido com a mesma configuração deste scraper"""
+        timeout_resultado = timeout_resultado or self.timeout_resultado
+        if self.backend == "http":
+            return BackendHTTP(self.url_api, timeout=timeout_resultado)
+        return type(self)(
+            self.arquivo_csv,
+            headless=self.headless,
+            perfil_enxuto=self.perfil_enxuto,
+            modo_espera=self.modo_espera,
+            timeout_resultado=timeout_resultado,
+            url_base=self.url_base,
+            num_abas=self.num_abas
+        )
+    
+    def _detectar_separador(self):
+        """Detecta o separador do CSV pela primeira linha"""
+        with open(self.arquivo_csv, 'r', encoding='utf-8') as f:
+            primeira_linha = f.readline()
+        
+        separador = ';' if ';' in primeira_linha else ','
+        logger.info(f"Separador detectado: '{separador}'")
+        return separador
+    
+    def mapear_colunas(self, colunas):
+        """Resolve, uma vez por arquivo, quais colunas existentes alimentam cada parte do endereço"""
+        return {
+            tipo: [nome_col for nome_col in possiveis_nomes if nome_col in colunas]
+            for tipo, possiveis_nomes in COLUNAS_MAPEADAS.items()
+        }
+    
+    def _preparar_enderecos(self, df, mapeamento):
+        """Monta endereco_completo com operações vetorizadas por coluna"""
+        df.columns = df.columns.str.strip()
+        
+        def limpar(coluna):
+            valores = df[coluna].fillna('').astype(str).str.strip()
+            return valores.mask(valores.str.lower().isin(VALORES_VAZIOS), '')
+        
+        def juntar(partes):
+            endereco = pd.Series('', index=df.index)
+            for parte in partes:
+                separador = np.where((endereco != '') & (parte != ''), ', ', '')
+                endereco = endereco + separador + parte
+            return endereco
+        
+        # Só pega a primeira coluna não vazia de cada tipo
+        partes = {}
+        for tipo, colunas in mapeamento.items():
+            if not colunas:
+                continue
+            valores = limpar(colunas[0])
+            for coluna in colunas[1:]:
+                valores = valores.mask(valores == '', limpar(coluna))
+            
+            if tipo == 'cep':
+                valores = normalizar_cep(valores)
+            partes[tipo] = valores
+        
+        motivos = None
+        if self.validar_enderecos:
+            partes, motivos = self._validar_partes(df, partes, mapeamento)
+        
+        endereco_completo = juntar(partes[tipo] for tipo in COLUNAS_MAPEADAS if tipo in partes)
+        
+        # Se não conseguiu mapear, tenta usar todas as colunas
+        sem_mapeamento = endereco_completo == ''
+        if sem_mapeamento.any():
+            todas_partes = juntar([limpar(col) for col in df.columns])
+            endereco_completo = endereco_completo.mask(sem_mapeamento, todas_partes)
+            # Essas linhas não passaram pelas colunas validadas: seguem para a consulta como antes
+            if motivos is not None:
+                motivos = motivos.mask(sem_mapeamento)
+        
+        df['endereco_completo'] = endereco_completo
+        
+        # Linhas sem conserto vão para o arquivo de rejeitados, sem consulta ao ONR
+        if motivos is not None and motivos.notna().any():
+            df = self._rejeitar(df, motivos)
+        
+        # Remove endereços vazios
+        return df[df['endereco_completo'].str.len() > 10]
+    
+    def _validar_partes(self, df, partes, mapeamento):
+        """Corrige colunas deslocadas e aponta o motivo de rejeição de cada linha (NaN se válida)"""
+        vazio = pd.Series('', index=df.index)
+        for tipo in COLUNAS_MAPEADAS:
+            partes.setdefault(tipo, vazio)
+        
+        # Deslocamento: o CEP não está na coluna cep, mas em outra coluna depois da rua
+        e_cep = {tipo: partes[tipo].str.fullmatch(REGEX_CEP_CAMPO) for tipo in ('bairro', 'cidade', 'uf', 'pais')}
+        deslocadas = ~partes['cep'].str.fullmatch(REGEX_CEP_CAMPO) & pd.concat(e_cep, axis=1).any(axis=1)
+        if deslocadas.any():
+            partes = {tipo: valores.copy() for tipo, valores in partes.items()}
+            for linha in deslocadas[deslocadas].index:
+                for tipo, valor in self._reposicionar({tipo: partes[tipo][linha] for tipo in partes}).items():
+                    partes[tipo][linha] = valor
+            
+            # Grava as correções nas colunas originais, quando existem
+            for tipo, colunas in mapeamento.items():
+                if colunas:
+                    df.loc[deslocadas, colunas[0]] = partes[tipo][deslocadas]
+        
+        # UF ausente ou não reconhecida é completada pelo CEP
+        uf_informada = sigla_uf(partes['uf'])
+        uf_cep = uf_do_cep(partes['cep'])
+        completar = uf_informada.isna() & uf_cep.notna()
+        if completar.any():
+            partes['uf'] = partes['uf'].mask(completar, uf_cep)
+            if mapeamento['uf']:
+                df.loc[completar, mapeamento['uf'][0]] = uf_cep[completar]
+        
+        cep = partes['cep']
+        motivos = pd.Series(np.nan, index=df.index, dtype=object)
+        motivos = motivos.mask((cep != '') & ~cep.str.fullmatch(REGEX_CEP_CAMPO), "CEP inválido: " + cep)
+        conflito = uf_informada.notna() & uf_cep.notna() & (uf_informada != uf_cep)
+        motivos = motivos.mask(
+            motivos.isna() & conflito,
+            "CEP " + cep + " pertence a " + uf_cep.astype(str) + ", não a " + uf_informada.astype(str)
+        )
+        # Sem as duas colunas mapeadas, a cidade ou o CEP podem estar em outra coluna da linha
+        if mapeamento['cidade'] and mapeamento['cep']:
+            motivos = motivos.mask(
+                motivos.isna() & (partes['cidade'] == '') & uf_cep.isna(), "Sem cidade nem CEP válido"
+            )
+        
+        corrigidas = int(deslocadas.sum() + completar.sum())
+        if corrigidas or motivos.notna().any():
+            mensagem = f"🧹 Validação: {corrigidas} linhas corrigidas, {int(motivos.notna().sum())} rejeitadas"
+            print(mensagem)
+            logger.info(mensagem)
+        return partes, motivos
+    
+    def _reposicionar(self, valores):
+        """Redistribui os campos de uma linha deslocada reconhecendo CEP, UF e país pelo conteúdo"""
+        campos = [valores[tipo] for tipo in ('bairro', 'cidade', 'uf', 'cep', 'pais') if valores[tipo]]
+        indice_cep = next(i for i, campo in enumerate(campos) if re.fullmatch(REGEX_CEP_CAMPO, campo))
+        antes, depois = campos[:indice_cep], campos[indice_cep + 1:]
+        
+        corrigido = dict.fromkeys(valores, '')
+        corrigido['rua'] = valores['rua']
+        corrigido['cep'] = campos[indice_cep]
+        
+        # A UF é o último campo antes do CEP que nomeia um estado
+        if antes and normalizar_endereco(antes[-1]) in _SIGLAS_POR_NOME:
+            corrigido['uf'] = antes.pop()
+        if antes:
+            corrigido['cidade'] = antes.pop()
+        if antes:
+            corrigido['bairro'] = antes.pop()
+        if antes:
+            # Sobras à esquerda costumam ser o número ou complemento separado da rua
+            corrigido['rua'] = ', '.join([valores['rua']] + antes)
+        
+        # Depois do CEP só se espera o país; o resto é descartado
+        corrigido['pais'] = next((campo for campo in depois if campo.lower() in PAISES), '')
+        return corrigido
+    
+    def _rejeitar(self, df, motivos):
+        """Grava as linhas rejeitadas em <entrada>_rejeitados.csv e retorna as demais"""
+        if not self.gravar_rejeitados:
+            return df[motivos.isna()]
+        
+        rejeitadas = df[motivos.notna()].assign(motivo_rejeicao=motivos[motivos.notna()])
+        caminho = f"{os.path.splitext(self.arquivo_csv)[0]}_rejeitados.csv"
+        
+        # O primeiro bloco da execução recria o arquivo; os seguintes acrescentam
+        primeiro = not self._rejeitados_gravados
+        rejeitadas.to_csv(caminho, sep=';', index_label='linha', mode='w' if primeiro else 'a', header=primeiro)
+        self._rejeitados_gravados += len(rejeitadas)
+        
+        print(f"🚫 {len(rejeitadas)} linhas rejeitadas sem consulta: {caminho}")
+        return df[motivos.isna()]
+    
     def carregar_csv(self):
         """Carrega o CSV com endereços no formato especificado"""
         try:
             if not os.path.exists(self.arquivo_csv):
                 raise FileNotFoundError(f"Arquivo {self.arquivo_csv} não encontrado")
             
-            # Detecta o separador do CSV
-            with open(self.arquivo_csv, 'r', encoding='utf-8') as f:
-                primeira_linha = f.readline()
-                
-            separador = ';' if ';' in primeira_linha else ','
-            logger.info(f"Separador detectado: '{separador}'")
+            self._rejeitados_gravados = 0
             
             # Lê o CSV com o separador correto
-            df = pd.read_csv(self.arquivo_csv, sep=separador)
+            df = pd.read_csv(self.arquivo_csv, sep=self._detectar_separador(), dtype=str)
             logger.info(f"CSV carregado: {len(df)} linhas, Colunas: {df.columns.tolist()}")
             
             # Limpa nomes das colunas (remove espaços)
             df.columns = df.columns.str.strip()
             logger.info(f"Colunas após limpeza: {df.columns.tolist()}")
             
-            # Constrói endereço completo baseado nas colunas disponíveis
-            enderecos_completos = []
-            
-            for _, row in df.iterrows():
-                partes_endereco = []
-                
-                # Mapeamento flexível de colunas
-                colunas_mapeadas = {
-                    'rua': ['rua', 'logradouro', 'endereco', 'address'],
-                    'bairro': ['bairro', 'distrito', 'neighborhood'],
-                    'cidade': ['cidade', 'city', 'municipio'],
-                    'uf': ['uf', 'estado', 'state'],
-                    'cep': ['cep', 'postal_code', 'zip'],
-                    'pais': ['pais', 'país', 'country']
-                }
-                
-                # Adiciona cada parte do endereço se não for vazia
-                for tipo, possiveis_nomes in colunas_mapeadas.items():
-                    for nome_col in possiveis_nomes:
-                        if nome_col in df.columns and pd.notna(row[nome_col]):
-                            valor = str(row[nome_col]).strip()
-                            if valor and valor.lower() not in ['nan', 'null', '']:
-                                if tipo == 'cep' and len(valor) == 8 and valor.isdigit():
-                                    # Formata CEP
-                                    valor = f"{valor[:5]}-{valor[5:]}"
-                                partes_endereco.append(valor)
-                                break  # Só pega a primeira coluna que encontrar
-                
-                if partes_endereco:
-                    endereco_completo = ", ".join(partes_endereco)
-                    enderecos_completos.append(endereco_completo)
-                else:
-                    # Se não conseguiu mapear, tenta usar todas as colunas
-                    todas_partes = []
-                    for col in df.columns:
-                        if pd.notna(row[col]):
-                            valor = str(row[col]).strip()
-                            if valor and valor.lower() not in ['nan', 'null', '']:
-                                todas_partes.append(valor)
-                    
-                    if todas_partes:
-                        endereco_completo = ", ".join(todas_partes)
-                        enderecos_completos.append(endereco_completo)
-                    else:
-                        enderecos_completos.append("")
-            
-            df['endereco_completo'] = enderecos_completos
-            
-            # Remove endereços vazios
-            df = df[df['endereco_completo'].str.len() > 10]
+            df = self._preparar_enderecos(df, self.mapear_colunas(df.columns))
             
             logger.info(f"Endereços válidos carregados: {len(df)}")
             return df
@@ -150,8 +1966,35 @@ class CartorioScraperOtimizado:
             logger.error(f"Erro ao carregar CSV: {e}")
             raise
     
-    def aguardar_mapa_carregado(self):
-        """Aguarda o mapa carregar - versão mais robusta"""
+    def carregar_csv_em_blocos(self, tamanho_bloco):
+        """Lê o CSV em blocos de tamanho fixo, com memória limitada, já com endereco_completo montado"""
+        if not os.path.exists(self.arquivo_csv):
+            raise FileNotFoundError(f"Arquivo {self.arquivo_csv} não encontrado")
+        
+        self._rejeitados_gravados = 0
+        leitor = pd.read_csv(self.arquivo_csv, sep=self._detectar_separador(), dtype=str, chunksize=tamanho_bloco)
+        mapeamento = None
+        with leitor:
+            for numero, df in enumerate(leitor, 1):
+                if mapeamento is None:
+                    mapeamento = self.mapear_colunas(df.columns.str.strip())
+                    logger.info(f"Colunas mapeadas: {mapeamento}")
+                
+                df = self._preparar_enderecos(df, mapeamento)
+                logger.info(f"Bloco {numero}: {len(df)} endereços válidos")
+                yield df
+    
+    def _filtrar_shard(self, df):
+        """Mantém só as linhas deste shard, guardando a linha original do CSV na coluna 'linha'"""
+        numero, total = self.shard
+        shards = df['endereco_completo'].map(lambda endereco: indice_shard(endereco, total))
+        df = df[shards == numero].copy()
+        df.insert(0, 'linha', df.index)
+        return df
+    
+    @cronometrado("aguardar_mapa_carregado")
+    def aguardar_mapa_carregado(self, timeout=40):
+        """Aguarda o mapa carregar - retorna assim que o campo de busca estiver pronto"""
         try:
             logger.info("Aguardando carregamento completo da página...")
             
@@ -159,65 +2002,17 @@ class CartorioScraperOtimizado:
             self.wait.until(EC.presence_of_element_located((By.TAG_NAME, "body")))
             logger.info("DOM básico carregado")
             
-            # 2. Aguarda mais tempo para JavaScript executar
-            time.sleep(8)
+            # 2. Aguarda o campo de busca ficar visível e habilitado, sem pausas fixas
+            def campo_pronto(driver):
+                return driver.execute_script(JS_ENCONTRAR_CAMPO, SELETORES_CAMPO_BUSCA) or False
             
-            # 3. Verifica se a página está realmente carregada
-            max_tentativas = 6
-            for tentativa in range(max_tentativas):
-                logger.info(f"Tentativa {tentativa + 1}/{max_tentativas} - Verificando elementos...")
-                
-                # Verifica múltiplos indicadores de carregamento
-                indicadores_carregamento = [
-                    # Campos de busca possíveis
-                    "input[type='text']",
-                    "input[placeholder*='endereço']",
-                    "input[placeholder*='Digite']",
-                    ".leaflet-control-geocoder",
-                    "#geocoder",
-                    
-                    # Elementos do mapa
-                    ".leaflet-container",
-                    ".leaflet-map-pane",
-                    "canvas",
-                    
-                    # Botões ou controles
-                    "button",
-                    ".btn"
-                ]
-                
-                elementos_encontrados = 0
-                campo_busca_encontrado = False
-                
-                for seletor in indicadores_carregamento:
-                    try:
-                        elementos = self.driver.find_elements(By.CSS_SELECTOR, seletor)
-                        if elementos:
-                            elementos_encontrados += 1
-                            logger.info(f"  ✓ Encontrado: {seletor} ({len(elementos)} elementos)")
-                            
-                            # Verifica especificamente campos de busca
-                            if "input" in seletor:
-                                for elem in elementos:
-                                    if elem.is_displayed() and elem.is_enabled():
-                                        campo_busca_encontrado = True
-                                        logger.info(f"  ✓ Campo de busca funcional encontrado!")
-                                        break
-                    except Exception as e:
-                        logger.debug(f"Erro verificando {seletor}: {e}")
-                
-                logger.info(f"Elementos encontrados: {elementos_encontrados}")
-                
-                # Se encontrou elementos suficientes, considera carregado
-                if elementos_encontrados >= 3:
-                    if campo_busca_encontrado:
-                        logger.info("✅ Mapa carregado completamente!")
-                        return True
-                    else:
-                        logger.info("Elementos encontrados, mas sem campo de busca funcional")
-                
-                # Aguarda mais tempo antes da próxima tentativa
-                time.sleep(5)
+            try:
+                campo, descricao = WebDriverWait(self.driver, timeout, poll_frequency=0.25).until(campo_pronto)
+                self._campo_busca = campo
+                logger.info(f"✅ Mapa carregado completamente! Campo de busca pronto ({descricao})")
+                return True
+            except TimeoutException:
+                logger.info(f"Campo de busca não ficou pronto em {timeout}s")
             
             # Última tentativa: verifica qualquer input visível
             logger.info("Última tentativa: procurando qualquer input visível...")
@@ -240,68 +2035,77 @@ class CartorioScraperOtimizado:
             logger.error(f"❌ Erro inesperado ao aguardar carregamento: {e}")
             return False
     
+    @cronometrado("encontrar_campo_busca")
     def encontrar_campo_busca(self):
-        """Encontra o campo de busca mais provável"""
-        seletores = [
-            "input[placeholder*='endereço']",
-            "input[placeholder*='Digite']",
-            "input[placeholder*='Buscar']",
-            "input[placeholder*='Search']",
-            ".leaflet-control-geocoder input",
-            "#geocoder input",
-            ".search-input",
-            ".address-input",
-            "input[type='text']:visible"
-        ]
+        """Encontra o campo de busca mais provável (reaproveita o campo já encontrado)"""
+        if self._campo_busca is not None:
+            return self._campo_busca
         
         logger.info("Procurando campo de busca...")
         
-        for i, seletor in enumerate(seletores):
-            try:
-                elementos = self.driver.find_elements(By.CSS_SELECTOR, seletor)
-                for elemento in elementos:
-                    if elemento.is_displayed() and elemento.is_enabled():
-                        logger.info(f"✓ Campo encontrado com seletor {i+1}: {seletor}")
-                        return elemento
-            except Exception as e:
-                logger.debug(f"Erro com seletor {seletor}: {e}")
-        
-        # Fallback: pega o primeiro input visível e grande o suficiente
         try:
-            logger.info("Fallback: procurando inputs visíveis...")
-            inputs = self.driver.find_elements(By.CSS_SELECTOR, "input[type='text']")
-            for inp in inputs:
-                if inp.is_displayed() and inp.size['width'] > 100 and inp.size['height'] > 20:
-                    logger.info(f"✓ Campo fallback encontrado: width={inp.size['width']}, height={inp.size['height']}")
-                    return inp
+            encontrado = self.driver.execute_script(JS_ENCONTRAR_CAMPO, SELETORES_CAMPO_BUSCA)
         except Exception as e:
-            logger.error(f"Erro no fallback: {e}")
+            logger.error(f"Erro ao procurar campo de busca: {e}")
+            return None
         
-        logger.error("❌ Nenhum campo de busca encontrado")
-        return None
+        if not encontrado:
+            logger.error("❌ Nenhum campo de busca encontrado")
+            return None
+        
+        self._campo_busca, descricao = encontrado
+        logger.info(f"✓ Campo encontrado com {descricao}")
+        return self._campo_busca
+    
+    def _campo_limpo(self):
+        """Campo de busca vazio e pronto; o campo em cache só é procurado de novo se ficar obsoleto"""
+        campo = self.encontrar_campo_busca()
+        if not campo:
+            return None
+        try:
+            campo.clear()
+        except StaleElementReferenceException:
+            self._campo_busca = None
+            campo = self.encontrar_campo_busca()
+            if not campo:
+                return None
+            campo.clear()
+        return campo
     
+    @cronometrado("buscar_endereco")
     def buscar_endereco(self, endereco):
         """Busca um endereço no mapa"""
         try:
             logger.info(f"Buscando: {endereco}")
             
-            # Encontra campo de busca
-            campo = self.encontrar_campo_busca()
+            campo = self._campo_limpo()
             if not campo:
                 return "❌ Campo de busca não encontrado"
             
-            # Limpa e digita endereço
-            campo.clear()
-            time.sleep(1)
-            campo.send_keys(endereco)
-            time.sleep(1.5)
-            campo.send_keys(Keys.ENTER)
-            
-            # Aguarda resultado com tempo maior
-            time.sleep(6)
+            texto = None
+            if self.modo_espera == "fixo":
+                # Digita endereço
+                time.sleep(1)
+                campo.send_keys(endereco)
+                time.sleep(1.5)
+                campo.send_keys(Keys.ENTER)
+                
+                # Aguarda resultado com tempo maior
+                time.sleep(6)
+            else:
+                campo.send_keys(endereco)
+                texto_anterior = self.driver.execute_script(JS_PREPARAR_ESPERA, SELETORES_RESULTADO, PALAVRAS_CHAVE_CARTORIO)
+                campo.send_keys(Keys.ENTER)
+                
+                # Retorna assim que o resultado aparecer, com limite rígido
+                texto = self.aguardar_resultado(texto_anterior)
+                if texto is None:
+                    # O popup ainda exibido é o do endereço anterior: não vale como resposta
+                    logger.warning(f"⏱️ Resultado não apareceu em {self.timeout_resultado}s")
+                    return "❌ Tempo esgotado aguardando o resultado"
             
-            # Extrai informação do cartório
-            info_cartorio = self.extrair_info_cartorio()
+            # Extrai informação do cartório (a espera por evento já trouxe o texto)
+            info_cartorio = self.limpar_texto_cartorio(texto) if texto else self.extrair_info_cartorio()
             logger.info(f"Resultado: {info_cartorio[:100]}...")
             
             return info_cartorio
@@ -311,46 +2115,105 @@ class CartorioScraperOtimizado:
             logger.error(erro)
             return erro
     
+    def _bloquear_urls(self):
+        """Bloqueia via CDP os recursos do perfil enxuto; vale só para a aba atual"""
+        self.driver.execute_cdp_cmd("Network.enable", {})
+        self.driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": URLS_BLOQUEADAS_PERFIL_ENXUTO})
+    
+    def abrir_abas(self, num_abas):
+        """Abre abas extras em url_base, cada uma aquecida pelo aguardar_mapa_carregado; retorna as abas prontas"""
+        principal = self.driver.current_window_handle
+        self.abas = {principal: self._campo_busca}
+        for numero in range(2, num_abas + 1):
+            self.driver.switch_to.new_window('tab')
+            if self.perfil_enxuto:
+                self._bloquear_urls()
+            self.driver.get(self.url_base)
+            self._campo_busca = None
+            if self.aguardar_mapa_carregado():
+                self.abas[self.driver.current_window_handle] = self._campo_busca
+            else:
+                logger.warning(f"⚠️  Aba {numero} não carregou o mapa e foi fechada")
+                self.driver.close()
+                # Sem janela atual após o close, a próxima aba não abriria
+                self.driver.switch_to.window(principal)
+        
+        self.driver.switch_to.window(principal)
+        self._aba_atual = principal
+        self._campo_busca = self.abas[principal]
+        return list(self.abas)
+    
+    def _ativar_aba(self, aba):
+        """Passa o driver para a aba, guardando o campo de busca da aba anterior"""
+        if self._aba_atual != aba:
+            self.abas[self._aba_atual] = self._campo_busca
+            self.driver.switch_to.window(aba)
+            self._aba_atual = aba
+            self._campo_busca = self.abas[aba]
+    
+    def enviar_busca(self, aba, endereco):
+        """Dispara a busca na aba sem esperar o resultado; retorna None ou a mensagem de erro"""
+        try:
+            self._ativar_aba(aba)
+            campo = self._campo_limpo()
+            if not campo:
+                return "❌ Campo de busca não encontrado"
+            campo.send_keys(endereco)
+            texto_anterior = self.driver.execute_script(JS_PREPARAR_ESPERA, SELETORES_RESULTADO, PALAVRAS_CHAVE_CARTORIO)
+            campo.send_keys(Keys.ENTER)
+            self._em_voo[aba] = (texto_anterior, time.monotonic() + self.timeout_resultado)
+            return None
+        except Exception as e:
+            erro = f"❌ Erro na busca: {str(e)}"
+            logger.error(erro)
+            return erro
+    
+    def ler_busca(self, aba):
+        """Lê a aba sem bloquear: o cartório, um erro após o timeout ou None se ainda aguarda"""
+        texto_anterior, prazo = self._em_voo[aba]
+        try:
+            self._ativar_aba(aba)
+            estado = self.driver.execute_script(JS_LER_RESULTADO, SELETORES_RESULTADO, PALAVRAS_CHAVE_CARTORIO)
+            texto = estado.get('texto')
+            if texto and (estado.get('mutacoes') or texto != texto_anterior):
+                del self._em_voo[aba]
+                return self.limpar_texto_cartorio(texto)
+            if time.monotonic() < prazo:
+                return None
+            
+            # O popup ainda exibido na aba é o da busca anterior: não vale como resposta
+            del self._em_voo[aba]
+            logger.warning(f"⏱️ Resultado não apareceu em {self.timeout_resultado}s")
+            return "❌ Tempo esgotado aguardando o resultado"
+        except Exception as e:
+            self._em_voo.pop(aba, None)
+            erro = f"❌ Erro na busca: {str(e)}"
+            logger.error(erro)
+            return erro
+    
+    def aguardar_resultado(self, texto_anterior, timeout=None):
+        """Aguarda um resultado novo de cartório aparecer na página"""
+        timeout = timeout or self.timeout_resultado
+        
+        def resultado_novo(driver):
+            estado = driver.execute_script(JS_LER_RESULTADO, SELETORES_RESULTADO, PALAVRAS_CHAVE_CARTORIO)
+            texto = estado.get('texto')
+            if texto and (estado.get('mutacoes') or texto != texto_anterior):
+                return texto
+            return False
+        
+        try:
+            return WebDriverWait(self.driver, timeout, poll_frequency=0.1).until(resultado_novo)
+        except TimeoutException:
+            return None
+    
+    @cronometrado("extrair_info_cartorio")
     def extrair_info_cartorio(self):
         """Extrai informações do cartório da página"""
         try:
-            # Seletores prioritários para informações de cartório
-            seletores_info = [
-                ".leaflet-popup-content",
-                ".popup-content", 
-                "div[style*='background-color: yellow']",
-                ".alert-info",
-                ".notification"
-            ]
-            
-            # Busca informações
-            for seletor in seletores_info:
-                try:
-                    elementos = self.driver.find_elements(By.CSS_SELECTOR, seletor)
-                    for elem in elementos:
-                        if elem.is_displayed():
-                            texto = elem.text.strip()
-                            if texto and len(texto) > 10:
-                                # Verifica se contém informação de cartório
-                                palavras_chave = ['registro', 'cartório', 'cartorio', 'ri ', 'cnpj', 'imóveis']
-                                if any(palavra in texto.lower() for palavra in palavras_chave):
-                                    return self.limpar_texto_cartorio(texto)
-                except:
-                    continue
-            
-            # Busca por XPath mais específico
-            try:
-                xpath_cartorio = "//*[contains(text(), 'Registro') or contains(text(), 'Cartório')]"
-                elementos = self.driver.find_elements(By.XPATH, xpath_cartorio)
-                for elem in elementos:
-                    if elem.is_displayed():
-                        # Pega o texto do elemento pai que pode ter mais informações
-                        parent = elem.find_element(By.XPATH, "..")
-                        texto = parent.text.strip()
-                        if len(texto) > 10:
-                            return self.limpar_texto_cartorio(texto)
-            except:
-                pass
+            texto = self.driver.execute_script(JS_EXTRAIR_CARTORIO, SELETORES_RESULTADO, PALAVRAS_CHAVE_CARTORIO)
+            if texto:
+                return self.limpar_texto_cartorio(texto)
             
             return "❌ Nenhuma informação de cartório encontrada"
             
@@ -359,107 +2222,343 @@ class CartorioScraperOtimizado:
     
     def limpar_texto_cartorio(self, texto):
         """Limpa e formata o texto do cartório"""
-        # Remove quebras de linha excessivas
-        texto = ' '.join(texto.split())
-        
-        # Limita o tamanho se muito longo
-        if len(texto) > 500:
-            texto = texto[:500] + "..."
-        
-        return texto
+        return limpar_texto_cartorio(texto)
     
-    def salvar_checkpoint(self, df, indice):
-        """Salva checkpoint do progresso"""
+    @cronometrado("salvar_checkpoint")
+    def salvar_checkpoint(self):
+        """Grava no diário os resultados acumulados desde o último checkpoint"""
         try:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            arquivo_checkpoint = f"checkpoint_{indice}_{timestamp}.csv"
-            
-            # Adiciona resultados até o momento
-            df_temp = df.copy()
-            df_temp['cartorio'] = self.resultados + [''] * (len(df) - len(self.resultados))
-            df_temp.to_csv(arquivo_checkpoint, index=False)
-            
-            logger.info(f"Checkpoint salvo: {arquivo_checkpoint}")
+            self.diario.salvar()
+            logger.info(f"Checkpoint salvo: {self.diario.caminho}")
             
         except Exception as e:
             logger.error(f"Erro ao salvar checkpoint: {e}")
     
-    def processar_enderecos(self):
-        """Processa todos os endereços do CSV"""
-        try:
-            print("=" * 60)
-            print("🏢 PROCESSANDO CARTÓRIOS - ONR")
-            print("=" * 60)
-            
-            # Carrega CSV
-            print("📂 Carregando CSV...")
-            df = self.carregar_csv()
-            
-            total = len(df)
-            print(f"📊 Total de endereços: {total}")
-            
-            # Mostra prévia
-            print("\n📋 Prévia dos endereços:")
-            for i, endereco in enumerate(df['endereco_completo'].head(3), 1):
-                print(f"  {i}. {endereco}")
-            if total > 3:
-                print(f"  ... e mais {total - 3} endereços")
-            
-            # Confirmação
-            resposta = input(f"\n🚀 Processar {total} endereços? (s/n): ")
-            if resposta.lower() not in ['s', 'sim']:
-                print("❌ Processamento cancelado")
-                return None
-            
-            # Setup do navegador
-            print("🔧 Configurando navegador...")
-            self.setup_driver()
-            
-            # Acessa o site
+    def _criar_pool(self, timeout_resultado=None):
+        """Cria o motor de consultas da execução: pool de sessões ou motor assíncrono"""
+        timeout_resultado = timeout_resultado or self.timeout_resultado
+        # O controlador de taxa é um só na execução, inclusive nas repetições
+        if self.pausa_entre_buscas is None and self.controlador is None:
+            self.controlador = ControladorTaxa(
+                taxa_inicial=self.taxa_inicial,
+                taxa_min=self.taxa_min,
+                taxa_max=self.taxa_max,
+                latencia_alvo=self.timeout_resultado / 3
+            )
+            print(f"🚦 Taxa adaptativa: {self.taxa_min}-{self.taxa_max} consultas/s (início {self.controlador.taxa})")
+        
+        if self.motor == "assincrono":
+            print(f"⚡ Motor assíncrono: até {self.max_em_voo} consultas simultâneas em {self.url_api}")
+            return PoolAssincrono(
+                self.url_api,
+                max_em_voo=self.max_em_voo,
+                max_por_host=self.max_por_host,
+                timeout=timeout_resultado,
+                controlador=self.controlador
+            )
+        
+        # Pool de sessões
+        if self.backend == "http":
+            print(f"🔧 Configurando {self.num_sessoes} sessão(ões) HTTP para {self.url_api}...")
+        else:
+            print(f"🔧 Configurando {self.num_sessoes} sessão(ões) do navegador"
+                  + (f" com {self.num_abas} abas cada..." if self.num_abas > 1 else "..."))
+            if self.limite_memoria_mb and psutil is None:
+                print("⚠️  psutil não instalado: a reciclagem por memória fica desativada")
             print(f"🌐 Acessando {self.url_base}...")
             print("⏳ Aguarde, carregamento pode demorar...")
+        return PoolSessoes(
+            functools.partial(self._nova_sessao, timeout_resultado),
+            num_sessoes=self.num_sessoes,
+            pausa_entre_buscas=self.pausa_entre_buscas,
+            controlador=self.controlador,
+            reciclar_apos=self.reciclar_apos if self.backend == "selenium" else None,
+            limite_memoria_mb=self.limite_memoria_mb if self.backend == "selenium" else None,
+            num_abas=self.num_abas
+        )
+    
+    def _gravar_prontas(self, df, final=False):
+        """Grava o trecho inicial do bloco já resolvido, em lotes de lote_saida linhas"""
+        while self._prontas < len(self.resultados) and self.resultados[self._prontas] is not None:
+            self._prontas += 1
+        
+        if self._prontas - self._gravadas >= self.lote_saida or (
+                final and (self._prontas > self._gravadas or self.escritor.linhas == 0)):
+            lote = df.iloc[self._gravadas:self._prontas].copy()
+            lote['cartorio'] = self.resultados[self._gravadas:self._prontas]
+            lote['origem'] = self.origens[self._gravadas:self._prontas]
+            self.escritor.escrever(lote)
+            self._gravadas = self._prontas
+    
+    def _repetir_falhas(self, falhas, enderecos, pendentes, registrar_grupo):
+        """Repete os endereços que falharam em passagens extras, com sessões novas e espera maior
+        
+        falhas mapeia o índice do grupo à última mensagem de erro; o que continuar falhando
+        ao fim das repetições é registrado como falha definitiva.
+        """
+        for passagem in range(1, self.repeticoes + 1):
+            indices = list(falhas)
+            if self._orcamento_repeticoes is not None:
+                indices = indices[:self._orcamento_repeticoes]
+                self._orcamento_repeticoes -= len(indices)
+            if not indices:
+                break
             
-            self.driver.get(self.url_base)
+            # As repetições usam sessões próprias, abertas uma vez por execução; as da passagem
+            # principal seguem abertas para o próximo lote
+            timeout = self.timeout_resultado * self.fator_espera_repeticao ** passagem
+            print(f"\n🔁 Repetição {passagem}/{self.repeticoes}: {len(indices)} endereços "
+                  f"(espera de até {timeout}s)")
+            if self.pool_repeticao is None:
+                self.pool_repeticao = self._criar_pool(timeout_resultado=timeout)
+            self.pool_repeticao.definir_timeout(timeout)
             
-            if not self.aguardar_mapa_carregado():
-                print("❌ Falha ao carregar o mapa")
-                print("💡 Tente executar novamente ou verificar sua conexão")
-                return None
+            def ao_repetir(i, resultado):
+                indice = indices[i]
+                if resultado.startswith("❌"):
+                    falhas[indice] = resultado
+                    return
+                del falhas[indice]
+                self._recuperadas += len(pendentes[indice])
+                registrar_grupo(indice, resultado)
+                print(f"    ♻️  Recuperado: {enderecos[indice]}")
+            
+            self.pool_repeticao.processar([enderecos[indice] for indice in indices], ao_concluir=ao_repetir)
+            print(f"🔁 Repetição {passagem}: {len(indices) - len(set(indices) & set(falhas))} recuperados, "
+                  f"{len(falhas)} ainda com falha")
+        
+        # Falhas definitivas
+        for indice, resultado in falhas.items():
+            registrar_grupo(indice, resultado)
+    
+    def _processar_bloco(self, df):
+        """Resolve o cartório de cada linha de um bloco: cache, deduplicação e pool de navegadores"""
+        total = len(df)
+        
+        enderecos = df['endereco_completo'].tolist()
+        linhas = df.index.tolist()
+        # None marca as linhas ainda sem resultado
+        self.resultados = [None] * total
+        self.origens = [None] * total
+        self._prontas = self._gravadas = 0
+        
+        # Linhas já concluídas em uma execução anterior interrompida
+        a_resolver = []
+        for posicao, (linha, endereco) in enumerate(zip(linhas, enderecos)):
+            registrado = self.diario.resultado(linha, endereco)
+            if registrado is not None:
+                # O diário só registra consultas feitas ao ONR
+                self.resultados[posicao] = registrado
+                self.origens[posicao] = "onr"
+            else:
+                a_resolver.append(posicao)
+        if len(a_resolver) < total:
+            print(f"♻️  Retomando: {total - len(a_resolver)} linhas já concluídas no diário")
+        
+        # Planejamento: uma consulta por endereço normalizado único
+        grupos = planejar_consultas(enderecos, a_resolver)
+        pendentes = list(grupos.values())
+        print(f"🧮 Endereços únicos: {len(grupos)} (duplicatas agrupadas: {len(a_resolver) - len(grupos)})")
+        
+        # Consulta o cache antes de abrir qualquer navegador
+        if self.cache:
+            pendentes = []
+            resolvidos_cache = 0
+            for posicoes in grupos.values():
+                em_cache = self.cache.obter(enderecos[posicoes[0]])
+                if em_cache is not None:
+                    resolvidos_cache += 1
+                    for posicao in posicoes:
+                        self.resultados[posicao] = em_cache
+                        self.origens[posicao] = "cache"
+                else:
+                    pendentes.append(posicoes)
+            print(f"💾 Encontrados no cache: {resolvidos_cache} | A consultar: {len(pendentes)}")
+        
+        # CEPs que o histórico associa sem ambiguidade a um único cartório dispensam a consulta
+        if self.indice_cep is not None and pendentes:
+            respostas = self.indice_cep.consultar([extrair_cep(enderecos[posicoes[0]]) for posicoes in pendentes])
+            restantes = []
+            por_nivel = {"cep": 0, "prefixo": 0}
+            for posicoes, (cartorio, nivel) in zip(pendentes, respostas):
+                if cartorio is None:
+                    restantes.append(posicoes)
+                    continue
+                por_nivel[nivel] += 1
+                for posicao in posicoes:
+                    self.resultados[posicao] = cartorio
+                    self.origens[posicao] = f"indice_{nivel}"
+            pendentes = restantes
+            print(f"🗺️  Pelo índice de CEP: {por_nivel['cep']} (prefixo: {por_nivel['prefixo']}) | A consultar: {len(pendentes)}")
+        
+        print(f"💡 Consultas ao navegador economizadas: {total - len(pendentes)} de {total}")
+        
+        if pendentes:
+            if not self._confirmado:
+                # Confirmação
+                resposta = input(f"\n🚀 Processar {len(pendentes)} endereços? (s/n): ")
+                if resposta.lower() not in ['s', 'sim']:
+                    print("❌ Processamento cancelado")
+                    return None
+                self._confirmado = True
             
-            print("✅ Mapa carregado com sucesso")
+            if self.pool is None:
+                self.pool = self._criar_pool()
             
             # Processa endereços
             print(f"\n🔄 Iniciando processamento...")
-            self.resultados = []
+            concluidos = [0]
             
-            for i, (_, row) in enumerate(df.iterrows()):
-                endereco = row['endereco_completo']
+            def registrar_grupo(indice, resultado):
+                # Replica o resultado para todas as linhas do grupo
+                posicao = pendentes[indice][0]
+                for posicao_grupo in pendentes[indice]:
+                    self.resultados[posicao_grupo] = resultado
+                    self.origens[posicao_grupo] = "onr"
+                    self.diario.registrar(linhas[posicao_grupo], enderecos[posicao_grupo], resultado)
+                if self.cache:
+                    self.cache.salvar(enderecos[posicao], resultado)
                 
-                print(f"\n📍 [{i+1}/{total}] {endereco}")
-                
-                # Busca informação do cartório
-                resultado = self.buscar_endereco(endereco)
-                self.resultados.append(resultado)
+                # Grava as linhas que já formam um trecho contínuo resolvido
+                self._gravar_prontas(df)
+            
+            falhas = {}
+            
+            def ao_concluir(indice, resultado):
+                concluidos[0] += 1
+                print(f"\n📍 [{concluidos[0]}/{len(pendentes)}] {enderecos[pendentes[indice][0]]}")
                 
                 # Mostra resultado resumido
                 resultado_resumido = resultado[:80] + "..." if len(resultado) > 80 else resultado
-                print(f"    ✅ {resultado_resumido}")
+                if resultado.startswith("❌") and self.repeticoes:
+                    # A falha fica para a repetição, sem segurar a passagem principal
+                    falhas[indice] = resultado
+                    print(f"    ⏭️  {resultado_resumido} (repetição adiada)")
+                else:
+                    registrar_grupo(indice, resultado)
+                    print(f"    ✅ {resultado_resumido}")
                 
                 # Checkpoint a cada 5 endereços
-                if (i + 1) % 5 == 0:
-                    self.salvar_checkpoint(df, i + 1)
-                    print(f"    💾 Checkpoint salvo ({i+1}/{total})")
+                if concluidos[0] % 5 == 0:
+                    self.salvar_checkpoint()
+                    print(f"    💾 Checkpoint salvo ({concluidos[0]}/{len(pendentes)})")
+            
+            # Linhas resolvidas pelo diário ou pelo cache já podem ser gravadas
+            self._gravar_prontas(df)
+            consultas = [enderecos[posicoes[0]] for posicoes in pendentes]
+            
+            # Com repetições, as falhas são repetidas a cada lote de saída: uma falha no começo
+            # não segura a gravação do resto da execução até o fim do bloco
+            tamanho_trecho = self.lote_saida if self.repeticoes else len(pendentes)
+            for inicio in range(0, len(pendentes), tamanho_trecho):
+                fim = min(inicio + tamanho_trecho, len(pendentes))
+                resultados_pool = self.pool.processar(
+                    consultas[inicio:fim],
+                    ao_concluir=lambda i, resultado, deslocamento=inicio: ao_concluir(deslocamento + i, resultado)
+                )
                 
-                # Pausa entre buscas
-                time.sleep(3)
+                if all(r.startswith("❌ Nenhuma sessão") for r in resultados_pool):
+                    print("❌ Falha ao carregar o mapa")
+                    print("💡 Tente executar novamente ou verificar sua conexão")
+                    return None
+                
+                if falhas:
+                    self._repetir_falhas(falhas, consultas, pendentes, registrar_grupo)
+                    falhas.clear()
+        else:
+            print("✅ Todos os endereços já estavam no cache, navegador não será aberto")
+        
+        # Adiciona resultados ao DataFrame e grava o que faltou
+        df['cartorio'] = self.resultados
+        df['origem'] = self.origens
+        self._gravar_prontas(df, final=True)
+        return df
+    
+    def processar_enderecos(self, confirmar=True):
+        """Processa todos os endereços do CSV
+        
+        Com tamanho_bloco definido, o arquivo é lido e gravado bloco a bloco e o
+        retorno é o caminho do arquivo final; caso contrário, retorna o DataFrame.
+        confirmar=False dispensa as perguntas de confirmação (execuções automáticas).
+        """
+        try:
+            print("=" * 60)
+            print("🏢 PROCESSANDO CARTÓRIOS - ONR")
+            print("=" * 60)
+            
+            self._confirmado = not confirmar
+            self._orcamento_repeticoes = self.max_repeticoes
+            self._recuperadas = 0
+            METRICAS.limpar()
+            if self.porta_metricas and self._servidor_metricas is None:
+                self._servidor_metricas = METRICAS.servir_prometheus(self.porta_metricas)
+            sufixo = f".shard{self.shard[0]}de{self.shard[1]}" if self.shard else ""
+            self.diario = DiarioCheckpoint(self.arquivo_csv, sufixo)
+            if self.diario.concluidos:
+                print(f"♻️  Diário encontrado: {self.diario.caminho} ({len(self.diario.concluidos)} linhas concluídas)")
+            if self.arquivo_cache:
+                self.cache = CacheCartorios(self.arquivo_cache, ttl_dias=self.ttl_cache_dias)
+            if self.arquivo_indice_cep and os.path.exists(self.arquivo_indice_cep):
+                self.indice_cep = IndiceCEP.carregar(self.arquivo_indice_cep, usar_prefixo=self.prefixo_cep)
+                print(f"🗺️  Índice de CEP carregado: {self.arquivo_indice_cep} ({len(self.indice_cep)} CEPs)")
+            elif self.reaproveitar_cep and self.cache:
+                self.indice_cep = IndiceCEP.construir(self.cache.resultados(), usar_prefixo=self.prefixo_cep)
+                print(f"🗺️  Índice de CEP montado do cache: {len(self.indice_cep)} CEPs")
             
-            # Adiciona resultados ao DataFrame
-            df['cartorio'] = self.resultados
+            if self.tamanho_bloco:
+                print(f"📂 Lendo CSV em blocos de {self.tamanho_bloco} linhas...")
+                if not self._confirmado:
+                    resposta = input(f"\n🚀 Processar {self.arquivo_csv} em blocos? (s/n): ")
+                    if resposta.lower() not in ['s', 'sim']:
+                        print("❌ Processamento cancelado")
+                        return None
+                    self._confirmado = True
+                blocos = self.carregar_csv_em_blocos(self.tamanho_bloco)
+                if self.shard:
+                    blocos = (self._filtrar_shard(df) for df in blocos)
+            else:
+                # Carrega CSV
+                print("📂 Carregando CSV...")
+                df = self.carregar_csv()
+                if self.shard:
+                    lidas = len(df)
+                    df = self._filtrar_shard(df)
+                    print(f"🧩 Shard {self.shard[0]}/{self.shard[1]}: {len(df)} de {lidas} endereços")
+                
+                total = len(df)
+                print(f"📊 Total de endereços: {total}")
+                
+                # Mostra prévia
+                print("\n📋 Prévia dos endereços:")
+                for i, endereco in enumerate(df['endereco_completo'].head(3), 1):
+                    print(f"  {i}. {endereco}")
+                if total > 3:
+                    print(f"  ... e mais {total - 3} endereços")
+                blocos = [df]
             
-            # Salva resultado final
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            arquivo_final = f"enderecos_cartorios_{timestamp}.csv"
-            df.to_csv(arquivo_final, index=False)
+            sufixo = f"_shard{self.shard[0]}de{self.shard[1]}" if self.shard else ""
+            arquivo_final = f"enderecos_cartorios_{timestamp}{sufixo}.{self.formato_saida}"
+            # Os lotes são gravados à medida que ficam prontos, sem esperar o fim da execução
+            self.escritor = EscritorResultados(arquivo_final, self.formato_saida)
+            total = sucessos = 0
+            deduzidos = {origem: 0 for origem in ORIGENS_INDICE}
+            
+            for numero, df in enumerate(blocos, 1):
+                if self.tamanho_bloco:
+                    print(f"\n📦 Bloco {numero}: {len(df)} endereços")
+                
+                if self._processar_bloco(df) is None:
+                    return None
+                
+                total += len(df)
+                sucessos += sum(1 for r in self.resultados if not r.startswith("❌"))
+                for origem in self.origens:
+                    if origem in deduzidos:
+                        deduzidos[origem] += 1
+            
+            self.escritor.fechar()
+            self.escritor = None
             
             # Relatório final
             print("\n" + "=" * 60)
@@ -468,42 +2567,339 @@ class CartorioScraperOtimizado:
             print(f"📄 Arquivo final: {arquivo_final}")
             
             # Estatísticas
-            sucessos = sum(1 for r in self.resultados if not r.startswith("❌"))
             erros = total - sucessos
             
             print(f"📊 Estatísticas:")
             print(f"   • Total processado: {total}")
             print(f"   • Sucessos: {sucessos}")
-            print(f"   • Erros: {erros}")
-            print(f"   • Taxa de sucesso: {(sucessos/total)*100:.1f}%")
+            if self.repeticoes:
+                print(f"     ↳ Na primeira passagem: {sucessos - self._recuperadas} | Recuperados na repetição: {self._recuperadas}")
+            if any(deduzidos.values()):
+                print(f"     ↳ Deduzidos pelo índice de CEP (coluna origem): {deduzidos['indice_cep']} por CEP, "
+                      f"{deduzidos['indice_prefixo']} por prefixo")
+            print(f"   • Falhas definitivas: {erros}")
+            print(f"   • Taxa de sucesso: {(sucessos/total)*100 if total else 0:.1f}%")
             
-            return df
+            # Taxa de consultas que o controlador realmente alcançou
+            if self.controlador:
+                taxa = self.controlador.resumo()
+                mensagem = (f"🚦 Taxa alcançada: {taxa['taxa_media'] * 60:.1f} consultas/min "
+                            f"(final {taxa['taxa_atual']}/s, {taxa['reducoes']} reduções em {taxa['falhas']} falhas)")
+                print(mensagem)
+                logger.info(mensagem)
+            
+            # Tempos por fase da execução, fora do padrão enderecos_cartorios_* dos resultados
+            arquivo_json, arquivo_csv = METRICAS.exportar(f"metricas_{timestamp}{sufixo}")
+            print(f"⏱️  Métricas por fase: {arquivo_json} | {arquivo_csv}")
+            
+            # Execução concluída: o diário não é mais necessário
+            self.diario.fechar(remover=True)
+            self.diario = None
+            
+            if self.tamanho_bloco:
+                return arquivo_final
+            return pd.concat([df, separar_cartorio(df['cartorio'])], axis=1)
             
         except Exception as e:
             logger.error(f"Erro no processamento: {e}")
             print(f"❌ Erro: {e}")
             
-            # Salva progresso parcial
-            if self.resultados:
-                try:
-                    df_backup = df.copy()
-                    df_backup['cartorio'] = self.resultados + [''] * (len(df) - len(self.resultados))
-                    arquivo_backup = f"backup_erro_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-                    df_backup.to_csv(arquivo_backup, index=False)
-                    print(f"💾 Backup salvo: {arquivo_backup}")
-                except:
-                    pass
+            # O progresso parcial fica no diário para a próxima execução
+            if self.diario:
+                print(f"💾 Progresso salvo no diário: {self.diario.caminho}")
             
             raise
             
         finally:
+            if self.escritor:
+                # Fecha o arquivo parcial de forma legível (no Parquet, grava o rodapé)
+                self.escritor.fechar()
+                self.escritor = None
+            if self.diario:
+                self.diario.fechar()
+                self.diario = None
+            if self.pool:
+                if self.backend == "selenium":
+                    print("🔄 Fechando navegadores...")
+                self.pool.encerrar()
+            if self.pool_repeticao:
+                self.pool_repeticao.encerrar()
+                self.pool_repeticao = None
             if self.driver:
-                print("🔄 Fechando navegador...")
                 self.driver.quit()
+            if self.cache:
+                self.cache.fechar()
+                self.cache = None
+
+def construir_indice_cep(arquivos, arquivo_indice="indice_cep.npz", arquivo_cache="cartorio_cache.sqlite"):
+    """Monta o índice de CEP a partir de saídas anteriores e do cache, e o grava em arquivo_indice"""
+    partes = []
+    for arquivo in arquivos:
+        df = ler_resultados(arquivo)
+        if 'endereco_completo' not in df.columns or 'cartorio' not in df.columns:
+            raise ValueError(f"{arquivo} não tem as colunas 'endereco_completo' e 'cartorio'")
+        print(f"📄 {arquivo}: {len(df)} linhas")
+        partes.append(resultados_consultados(df)[['endereco_completo', 'cartorio']])
+    
+    if arquivo_cache and os.path.exists(arquivo_cache):
+        cache = CacheCartorios(arquivo_cache)
+        try:
+            partes.append(cache.resultados())
+            print(f"💾 {arquivo_cache}: {len(partes[-1])} resultados")
+        finally:
+            cache.fechar()
+    
+    if not partes:
+        raise ValueError("Nenhum resultado anterior para montar o índice de CEP")
+    
+    indice = IndiceCEP.construir(pd.concat(partes, ignore_index=True))
+    indice.salvar(arquivo_indice)
+    print(f"✅ Índice de CEP gravado em {arquivo_indice}: {len(indice)} CEPs, "
+          f"{len(indice.niveis['prefixo']['chaves'])} prefixos, {len(indice.cartorios)} cartórios")
+    return indice
+
+
+def importar_para_cache(arquivos, arquivo_cache="cartorio_cache.sqlite"):
+    """Importa arquivos de saída anteriores para o cache de consultas"""
+    cache = CacheCartorios(arquivo_cache)
+    try:
+        total = 0
+        for arquivo in arquivos:
+            quantidade = cache.importar_csv(arquivo)
+            print(f"💾 {arquivo}: {quantidade} resultados importados")
+            total += quantidade
+        print(f"✅ Cache atualizado com {total} resultados")
+        return total
+    finally:
+        cache.fechar()
+
+def mesclar_shards(arquivos, arquivo_entrada=None, validar_enderecos=True):
+    """Junta as saídas dos shards na ordem do CSV de entrada e aponta linhas ausentes ou com erro
+    
+    validar_enderecos deve ser o mesmo das execuções dos shards, para que as linhas esperadas coincidam.
+    """
+    partes = []
+    for arquivo in arquivos:
+        parte = ler_resultados(arquivo).drop(columns=COLUNAS_CARTORIO, errors='ignore')
+        if 'linha' not in parte.columns:
+            raise ValueError(f"{arquivo} não tem a coluna 'linha' (foi gerado sem --shard?)")
+        print(f"🧩 {arquivo}: {len(parte)} linhas")
+        partes.append(parte)
+    
+    df = pd.concat(partes, ignore_index=True)
+    df['linha'] = df['linha'].astype(int)
+    df['cartorio'] = df['cartorio'].fillna("❌ Sem resultado")
+    
+    # Uma linha presente em mais de um arquivo (shard reexecutado) fica com o sucesso, se houver
+    df['_sucesso'] = ~df['cartorio'].str.startswith("❌")
+    repetidas = int(df.duplicated('linha').sum())
+    df = df.sort_values(['linha', '_sucesso'], kind='stable').drop_duplicates('linha', keep='last')
+    df = df.drop(columns='_sucesso')
+    
+    ausentes = []
+    if arquivo_entrada:
+        # As linhas esperadas são as válidas do CSV original, com o mesmo índice usado nos shards
+        leitor = CartorioScraperOtimizado(arquivo_entrada, validar_enderecos=validar_enderecos)
+        leitor.gravar_rejeitados = False
+        entrada = leitor.carregar_csv()
+        ausentes = entrada.index.difference(df['linha']).tolist()
+        entrada.insert(0, 'linha', entrada.index)
+        df = entrada.merge(df[['linha', 'cartorio'] + (['origem'] if 'origem' in df.columns else [])],
+                           on='linha', how='left')
+        df['cartorio'] = df['cartorio'].fillna("❌ Linha ausente nos shards")
+    
+    falhas = df.loc[df['cartorio'].str.startswith("❌"), 'linha']
+    falhas = falhas[~falhas.isin(ausentes)].tolist()
+    
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    arquivo_final = f"enderecos_cartorios_{timestamp}_mesclado.csv"
+    df = pd.concat([df, separar_cartorio(df['cartorio'])], axis=1)
+    df.to_csv(arquivo_final, index=False)
+    
+    print(f"📄 Arquivo mesclado: {arquivo_final} ({len(df)} linhas)")
+    if repetidas:
+        print(f"♻️  Linhas repetidas entre arquivos: {repetidas}")
+    if arquivo_entrada:
+        print(f"❓ Linhas ausentes: {len(ausentes)}" + (f" (ex.: {ausentes[:10]})" if ausentes else ""))
+    else:
+        print("💡 Informe --entrada para verificar linhas ausentes")
+    print(f"❌ Linhas com erro: {len(falhas)}" + (f" (ex.: {falhas[:10]})" if falhas else ""))
+    
+    # Pendências em arquivo separado, prontas para uma nova execução
+    if ausentes or falhas:
+        pendencias = df[df['linha'].isin(ausentes + falhas)].copy()
+        pendencias['motivo'] = np.where(pendencias['linha'].isin(ausentes), "ausente", "erro")
+        arquivo_pendencias = arquivo_final[:-len(".csv")] + "_pendencias.csv"
+        pendencias.to_csv(arquivo_pendencias, index=False)
+        print(f"📋 Pendências: {arquivo_pendencias}")
+    
+    return arquivo_final
+
+
+class ManipuladorConsultas(BaseHTTPRequestHandler):
+    """API local do modo daemon: GET/POST /consulta e GET /saude"""
+    
+    servico = None
+    
+    def _responder(self, status, dados):
+        corpo = json.dumps(dados, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+    
+    def _consultar(self, endereco):
+        if not endereco or len(endereco.strip()) <= 10:
+            self._responder(400, {"erro": "Informe um endereço completo em 'endereco'"})
+            return
+        cartorio, origem = self.servico.consultar(endereco.strip())
+        status = 200 if not cartorio.startswith("❌") else 502
+        self._responder(status, {"endereco": endereco, "cartorio": cartorio, "origem": origem})
+    
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/saude":
+            self._responder(200, self.servico.estado())
+        elif url.path == "/consulta":
+            self._consultar(parse_qs(url.query).get("endereco", [""])[0])
+        else:
+            self._responder(404, {"erro": "Rota não encontrada"})
+    
+    def do_POST(self):
+        if urlparse(self.path).path != "/consulta":
+            self._responder(404, {"erro": "Rota não encontrada"})
+            return
+        try:
+            tamanho = int(self.headers.get("Content-Length", 0))
+            dados = json.loads(self.rfile.read(tamanho) or b"{}")
+        except ValueError:
+            self._responder(400, {"erro": "JSON inválido"})
+            return
+        self._consultar(dados.get("endereco", ""))
+    
+    def log_message(self, formato, *args):
+        logger.info(f"API: {formato % args}")
+
+
+def executar_daemon(scraper, porta=8765, host="127.0.0.1"):
+    """Mantém sessões aquecidas e atende consultas avulsas pela API HTTP local"""
+    # Cada sessão do serviço atende uma consulta por vez; as abas só valem no processamento em lote
+    if scraper.num_abas > 1:
+        raise ValueError("O modo daemon não usa várias abas: use --sessoes para atender consultas simultâneas")
+    cache = CacheCartorios(scraper.arquivo_cache, ttl_dias=scraper.ttl_cache_dias) if scraper.arquivo_cache else None
+    if scraper.porta_metricas:
+        METRICAS.servir_prometheus(scraper.porta_metricas)
+    servico = ServicoConsultas(scraper._nova_sessao, num_sessoes=scraper.num_sessoes, cache=cache)
+    
+    print(f"🔧 Aquecendo {servico.num_sessoes} sessão(ões)...")
+    servico.iniciar()
+    
+    ManipuladorConsultas.servico = servico
+    servidor = ThreadingHTTPServer((host, porta), ManipuladorConsultas)
+    print(f"✅ Serviço pronto em http://{host}:{porta}/consulta?endereco=...")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        print("\n⏹️  Encerrando serviço...")
+    finally:
+        servidor.server_close()
+        servico.encerrar()
+        if cache:
+            cache.fechar()
+
 
 def main():
     """Função principal"""
-    arquivo_csv = input("📂 Digite o nome do arquivo CSV: ").strip()
+    parser = argparse.ArgumentParser(description="Consulta de cartórios de registro de imóveis no ONR")
+    parser.add_argument("--importar-cache", nargs="+", metavar="CSV",
+                        help="importa arquivos enderecos_cartorios_*.csv para o cache e sai")
+    parser.add_argument("--construir-indice-cep", nargs="*", metavar="CSV",
+                        help="monta indice_cep.npz com saídas anteriores e o cache, e sai")
+    parser.add_argument("--daemon", action="store_true",
+                        help="mantém sessões aquecidas e atende consultas avulsas por uma API HTTP local")
+    parser.add_argument("--porta", type=int, default=8765, help="porta da API do modo daemon (padrão 8765)")
+    parser.add_argument("--porta-metricas", type=int, metavar="PORTA",
+                        help="expõe os tempos por fase em http://127.0.0.1:PORTA/metrics (formato Prometheus)")
+    parser.add_argument("--sessoes", type=int, metavar="N", help="número de sessões paralelas")
+    parser.add_argument("--abas", type=int, default=1, metavar="N",
+                        help="abas por navegador com buscas simultâneas (padrão 1, não vale com --daemon)")
+    parser.add_argument("--headless", action="store_true", help="executa o navegador em modo invisível")
+    parser.add_argument("--perfil-enxuto", action="store_true",
+                        help="bloqueia tiles, imagens, fontes e scripts de terceiros no navegador")
+    parser.add_argument("--backend", choices=["selenium", "http"], default="selenium",
+                        help="selenium (navegador) ou http (endpoint de consulta direto)")
+    parser.add_argument("--url-api", metavar="URL",
+                        help="endpoint de consulta usado pelo backend http (ou variável ONR_URL_API)")
+    parser.add_argument("--motor", choices=["sincrono", "assincrono"], default="sincrono",
+                        help="assincrono mantém várias consultas HTTP em andamento (requer --backend http)")
+    parser.add_argument("--max-em-voo", type=int, default=20, metavar="N",
+                        help="consultas simultâneas no motor assíncrono (padrão 20)")
+    parser.add_argument("--max-por-host", type=int, metavar="N",
+                        help="limite de conexões simultâneas por host no motor assíncrono")
+    parser.add_argument("--taxa-min", type=float, default=0.1, metavar="N",
+                        help="taxa mínima de consultas por segundo do controlador adaptativo (padrão 0.1)")
+    parser.add_argument("--taxa-max", type=float, default=10.0, metavar="N",
+                        help="taxa máxima de consultas por segundo, somando todas as sessões (padrão 10)")
+    parser.add_argument("--pausa-fixa", type=float, metavar="SEGUNDOS",
+                        help="desativa o controlador e usa uma pausa fixa entre buscas de cada sessão")
+    parser.add_argument("--reciclar-apos", type=int, default=500, metavar="N",
+                        help="reabre o navegador de cada sessão após N buscas (0 desativa, padrão 500)")
+    parser.add_argument("--limite-memoria-mb", type=int, default=1500, metavar="MB",
+                        help="reabre o navegador quando o Chrome passa deste RSS (0 desativa, padrão 1500)")
+    parser.add_argument("--entrada", metavar="CSV", help="CSV de entrada (dispensa a pergunta do nome do arquivo)")
+    parser.add_argument("--shard", type=interpretar_shard, metavar="I/N",
+                        help="processa só o shard I de N (linhas escolhidas por hash do endereço normalizado)")
+    parser.add_argument("--mesclar", nargs="+", metavar="CSV",
+                        help="junta as saídas dos shards na ordem da --entrada e sai")
+    parser.add_argument("--formato-saida", choices=["csv", "parquet"], default="csv",
+                        help="formato do arquivo de resultados (parquet requer pyarrow)")
+    parser.add_argument("--lote-saida", type=int, default=500, metavar="N",
+                        help="grava os resultados em lotes de N linhas à medida que ficam prontos (padrão 500)")
+    parser.add_argument("--repeticoes", type=int, default=1, metavar="N",
+                        help="passagens extras para os endereços que falharam (0 desativa, padrão 1)")
+    parser.add_argument("--max-repeticoes", type=int, metavar="N",
+                        help="limite de endereços repetidos na execução inteira")
+    parser.add_argument("--reaproveitar-cep", action="store_true",
+                        help="sem indice_cep.npz, responde pelo cache os CEPs que sempre caíram no mesmo cartório")
+    parser.add_argument("--prefixo-cep", action="store_true",
+                        help="responde CEPs nunca vistos pelo prefixo de 5 dígitos do índice, sem consultar o ONR")
+    parser.add_argument("--sem-validacao", action="store_true",
+                        help="não valida CEP/UF nem corrige colunas deslocadas antes das consultas")
+    parser.add_argument("--tamanho-bloco", type=int, metavar="N",
+                        help="lê e grava o CSV em blocos de N linhas (arquivos muito grandes)")
+    args = parser.parse_args()
+    
+    if args.importar_cache:
+        importar_para_cache(args.importar_cache)
+        return
+    
+    if args.construir_indice_cep is not None:
+        construir_indice_cep(args.construir_indice_cep)
+        return
+    
+    if args.mesclar:
+        mesclar_shards(args.mesclar, args.entrada, validar_enderecos=not args.sem_validacao)
+        return
+    
+    if args.daemon:
+        try:
+            scraper = CartorioScraperOtimizado(
+                None,
+                headless=args.headless,
+                perfil_enxuto=args.perfil_enxuto,
+                num_sessoes=args.sessoes or 1,
+                num_abas=args.abas,
+                backend=args.backend,
+                url_api=args.url_api,
+                porta_metricas=args.porta_metricas
+            )
+            executar_daemon(scraper, porta=args.porta)
+        except Exception as e:
+            print(f"\n❌ Erro fatal: {e}")
+        return
+    
+    arquivo_csv = args.entrada or input("📂 Digite o nome do arquivo CSV: ").strip()
     
     if not arquivo_csv:
         arquivo_csv = "enderecos.csv"  # Padrão
@@ -516,10 +2912,42 @@ def main():
         return
     
     # Pergunta se quer usar modo headless
-    headless = input("🖥️  Executar em modo invisível? (s/n): ").lower() in ['s', 'sim']
+    headless = args.headless or input("🖥️  Executar em modo invisível? (s/n): ").lower() in ['s', 'sim']
+    
+    # Pergunta quantas sessões do Chrome rodar em paralelo
+    num_sessoes = args.sessoes
+    if not num_sessoes:
+        resposta_sessoes = input("🧵 Quantas sessões paralelas do navegador? (padrão 1): ").strip()
+        num_sessoes = int(resposta_sessoes) if resposta_sessoes.isdigit() and int(resposta_sessoes) > 0 else 1
     
     try:
-        scraper = CartorioScraperOtimizado(arquivo_csv, headless=headless)
+        scraper = CartorioScraperOtimizado(
+            arquivo_csv,
+            headless=headless,
+            perfil_enxuto=args.perfil_enxuto,
+            num_sessoes=num_sessoes,
+            num_abas=args.abas,
+            tamanho_bloco=args.tamanho_bloco,
+            backend=args.backend,
+            url_api=args.url_api,
+            motor=args.motor,
+            max_em_voo=args.max_em_voo,
+            max_por_host=args.max_por_host,
+            porta_metricas=args.porta_metricas,
+            pausa_entre_buscas=args.pausa_fixa,
+            taxa_min=args.taxa_min,
+            taxa_max=args.taxa_max,
+            reciclar_apos=args.reciclar_apos or None,
+            limite_memoria_mb=args.limite_memoria_mb or None,
+            shard=args.shard,
+            formato_saida=args.formato_saida,
+            lote_saida=args.lote_saida,
+            validar_enderecos=not args.sem_validacao,
+            reaproveitar_cep=args.reaproveitar_cep,
+            prefixo_cep=args.prefixo_cep,
+            repeticoes=args.repeticoes,
+            max_repeticoes=args.max_repeticoes
+        )
         resultado = scraper.processar_enderecos()
         
         if resultado is not None:
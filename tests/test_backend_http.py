@@ -0,0 +1,84 @@
+"""Backends HTTP contra a réplica local do ONR: o texto deve ser o mesmo do caminho Selenium"""
+
+import os
+import sys
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, "benchmark"))
+
+import oficial  # noqa: E402
+from servidor_onr_local import iniciar_servidor, resposta_cartorio  # noqa: E402
+
+ENDERECOS = [
+    "Av. Paulista, 1578, São Paulo, SP, 01310-200",
+    "Rua Augusta, 500, Consolação, São Paulo, SP, 01305-000",
+    "Rua XV de Novembro, 10, Centro, Curitiba, PR, 80020-310",
+    # Endereços com palavra-chave de cartório, ecoados pelo endpoint antes da resposta
+    "Rua José Antônio, 100, Centro, Registro, SP, 11900-000",
+    "Rua Henri Dunant, 500, Santo Amaro, São Paulo, SP, 04709-110",
+]
+
+
+def texto_selenium(endereco):
+    """O que o caminho Selenium devolve: o innerText do popup da réplica, limpo"""
+    return oficial.limpar_texto_cartorio(resposta_cartorio(endereco))
+
+
+@pytest.fixture(scope="module")
+def url_api():
+    servidor, _, url_api = iniciar_servidor(atraso_ms=0)
+    yield url_api
+    servidor.shutdown()
+
+
+def test_backend_http_devolve_o_texto_do_selenium(url_api):
+    pytest.importorskip("requests")
+    backend = oficial.BackendHTTP(url_api, timeout=5)
+    assert backend.iniciar_sessao()
+    try:
+        for endereco in ENDERECOS:
+            assert backend.buscar_endereco(endereco) == texto_selenium(endereco)
+    finally:
+        backend.encerrar_sessao()
+
+
+def test_pool_assincrono_devolve_o_texto_do_selenium_na_ordem(url_api):
+    pytest.importorskip("aiohttp")
+    enderecos = ENDERECOS * 4
+    concluidos = []
+    pool = oficial.PoolAssincrono(url_api, max_em_voo=5, timeout=5)
+    resultados = pool.processar(enderecos, ao_concluir=lambda posicao, _: concluidos.append(posicao))
+    assert resultados == [texto_selenium(endereco) for endereco in enderecos]
+    assert sorted(concluidos) == list(range(len(enderecos)))
+
+
+def test_backend_http_com_endpoint_fora_do_ar():
+    pytest.importorskip("requests")
+    backend = oficial.BackendHTTP("http://127.0.0.1:9/api/consulta", timeout=1)
+    backend.iniciar_sessao()
+    assert backend.buscar_endereco(ENDERECOS[0]).startswith("❌ Erro na busca")
+
+
+@pytest.mark.parametrize("conteudo, esperado", [
+    ('{"mensagem": "O endereço pertence ao\\n1º Registro de Imóveis de X - X - SP."}',
+     "O endereço pertence ao 1º Registro de Imóveis de X - X - SP."),
+    ('<div class="leaflet-popup-content">O endereço pertence ao<br>1º Registro de Imóveis de X - X - SP.</div>',
+     "O endereço pertence ao 1º Registro de Imóveis de X - X - SP."),
+    ('<div class="notification">Bem-vindo ao mapa</div>'
+     '<div class="leaflet-popup-content"><p>O endereço pertence ao</p><p>2º Registro de Imóveis de Y</p></div>',
+     "O endereço pertence ao 2º Registro de Imóveis de Y"),
+    ('{"resultado": []}', "❌ Nenhuma informação de cartório encontrada"),
+    ('{"local": "Centro, Registro - SP", "dados": {"texto_popup": "Pertence ao 1º Registro de Imóveis de Registro"}}',
+     "Pertence ao 1º Registro de Imóveis de Registro"),
+])
+def test_interpretar_resposta_onr_devolve_o_bloco_inteiro(conteudo, esperado):
+    assert oficial.interpretar_resposta_onr(conteudo) == esperado
+
+
+def test_interpretar_resposta_onr_ignora_o_endereco_ecoado():
+    consulta = "Rua José Antônio, 100, Centro, Registro, SP, 11900-000"
+    conteudo = '{"endereco": "%s", "extra": "%s"}' % (consulta, consulta.upper())
+    assert oficial.interpretar_resposta_onr(conteudo, consulta).startswith("❌")
@@ -0,0 +1,82 @@
+"""Validação das colunas antes da consulta: CEP normalizado, colunas deslocadas e UF em conflito"""
+
+import os
+import sys
+
+import pandas as pd
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import oficial  # noqa: E402
+
+COLUNAS = ["rua", "bairro", "cidade", "uf", "cep"]
+
+
+def carregar(tmp_path, linhas):
+    """Grava as linhas num CSV e devolve (endereços aceitos, rejeitados ou None)"""
+    arquivo = tmp_path / "entrada.csv"
+    pd.DataFrame(linhas, columns=COLUNAS).to_csv(arquivo, sep=";", index=False)
+    aceitos = oficial.CartorioScraperOtimizado(str(arquivo), arquivo_cache=None).carregar_csv()
+    rejeitados = tmp_path / "entrada_rejeitados.csv"
+    if not rejeitados.exists():
+        return aceitos, None
+    return aceitos, pd.read_csv(rejeitados, sep=";", dtype=str)
+
+
+def test_cep_sem_zero_a_esquerda_ou_com_ponto_e_aceito(tmp_path):
+    aceitos, rejeitados = carregar(tmp_path, [
+        ["Rua Augusta, 500", "Consolação", "São Paulo", "SP", "1305000"],
+        ["Rua XV de Novembro, 10", "Centro", "Curitiba", "PR", "80020.310"],
+        ["Av. Paulista, 1578", "Bela Vista", "São Paulo", "SP", "01.310-200"],
+    ])
+    assert rejeitados is None
+    assert [oficial.extrair_cep(endereco) for endereco in aceitos["endereco_completo"]] == [
+        "01305000", "80020310", "01310200"
+    ]
+    assert aceitos["endereco_completo"].iloc[0] == "Rua Augusta, 500, Consolação, São Paulo, SP, 01305-000"
+
+
+def test_cep_malformado_e_rejeitado(tmp_path):
+    aceitos, rejeitados = carregar(tmp_path, [
+        ["Rua Augusta, 500", "Consolação", "São Paulo", "SP", "0130"],
+        ["Av. Paulista, 1578", "Bela Vista", "São Paulo", "SP", "01310-200"],
+    ])
+    assert aceitos["cep"].tolist() == ["01310-200"]
+    assert rejeitados["motivo_rejeicao"].tolist() == ["CEP inválido: 0130"]
+
+
+def test_colunas_deslocadas_sao_reposicionadas(tmp_path):
+    # O número foi parar na coluna bairro e empurrou o resto uma coluna para a direita
+    arquivo = tmp_path / "entrada.csv"
+    arquivo.write_text(
+        "rua;bairro;cidade;uf;cep;pais\n"
+        "Rua Augusta;500;Consolação;São Paulo;SP;01305-000\n",
+        encoding="utf-8",
+    )
+    aceitos = oficial.CartorioScraperOtimizado(str(arquivo), arquivo_cache=None).carregar_csv()
+    linha = aceitos.iloc[0]
+    assert (linha["rua"], linha["bairro"], linha["cidade"], linha["uf"], linha["cep"]) == (
+        "Rua Augusta, 500", "Consolação", "São Paulo", "SP", "01305-000"
+    )
+    assert linha["endereco_completo"] == "Rua Augusta, 500, Consolação, São Paulo, SP, 01305-000"
+
+
+def test_uf_em_conflito_com_o_cep_e_rejeitada(tmp_path):
+    aceitos, rejeitados = carregar(tmp_path, [
+        ["Rua XV de Novembro, 10", "Centro", "Curitiba", "SP", "80020-310"],
+        ["Rua Augusta, 500", "Consolação", "São Paulo", "", "01305-000"],
+    ])
+    # UF ausente é completada pelo CEP; UF divergente do CEP não segue para a consulta
+    assert aceitos["uf"].tolist() == ["SP"]
+    assert rejeitados["motivo_rejeicao"].tolist() == ["CEP 80020-310 pertence a PR, não a SP"]
+
+
+def test_sem_validacao_nada_e_rejeitado(tmp_path):
+    arquivo = tmp_path / "entrada.csv"
+    pd.DataFrame(
+        [["Rua XV de Novembro, 10", "Centro", "Curitiba", "SP", "80020-310"]], columns=COLUNAS
+    ).to_csv(arquivo, sep=";", index=False)
+    scraper = oficial.CartorioScraperOtimizado(str(arquivo), arquivo_cache=None, validar_enderecos=False)
+    assert len(scraper.carregar_csv()) == 1
+    assert not (tmp_path / "entrada_rejeitados.csv").exists()